@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+
+'''Benchmark for the solver library. Uses the same test case files as clitest.py.'''
+
+import sys
+import time
+import argparse
+import subprocess
+import tracemalloc
+
+import lib
+from lib import compiler
+from lib import memory
+
+def readseries(filename):
+    '''Read the given series from a test case file.'''
+    result = []
+    
+    for line in open(filename):
+        tags = lib.alphabet.split(line)
+        
+        if len(tags) < 3: # An empty line
+            continue
+        
+        given = int(tags[0])
+        result.append(tags[2 : given + 2])
+    
+    return result
+
+def timed(function, *args):
+    '''Return the result of function and the time used for it.'''
+    start = time.time()
+    result = function(*args)
+    return result, time.time() - start
+
+def bench_generate(allseries, count):
+    '''Compare generating with the solver tree and with the compiled function.'''
+    solvetime = 0.
+    compiletime = 0.
+    treetime = 0.
+    compiledtime = 0.
+    
+    for series in allseries:
+        lib.base.clearcache()
+        solver, t = timed(lib.Solver, series)
+        solvetime += t
+        
+        expected, t = timed(solver.generatelist, count)
+        treetime += t
+        
+        # Solve again, so that the solvers called by the compiled code have empty caches
+        lib.base.clearcache()
+        compiled, t = timed(compiler.compile, lib.Solver(series))
+        compiletime += t
+        
+        generated, t = timed(compiled.generatelist, count)
+        compiledtime += t
+        
+        if generated != expected:
+            print("Compiled solver differs for series: " + ' '.join(series))
+    
+    print("Solving:            %0.3f" % solvetime)
+    print("Compiling:          %0.3f" % compiletime)
+    print("Generating %5d:   %0.3f" % (count, treetime))
+    print("Compiled %5d:     %0.3f (%0.1fx)" % (count, compiledtime, treetime / compiledtime))
+
+def bench_memory(allseries):
+    '''Measure the memory retained by the caches, by cache and by solver class.'''
+    lib.base.clearcache()
+    
+    for series in allseries:
+        solver = lib.Solver(series)
+        solver.generatelist(10)
+    
+    entries = len(lib.base.SelectSolver._solvingcache)
+    result = memory.report()
+    
+    print("Solving cache:      %d entries" % entries)
+    for name, size in sorted(result['caches'].items()):
+        print("  %-18s %d bytes" % (name + ':', size))
+    
+    print("Solvers:            %d bytes" % sum(result['classes'].values()))
+    for name, size in sorted(result['classes'].items(), key = lambda item: -item[1])[:10]:
+        print("  %-32s %d bytes" % (name + ':', size))
+    
+    print("Total:              %d bytes" % result['total'])
+    print("Per cache entry:    %d bytes" % (result['total'] // entries))
+    print("Per series:         %d bytes" % (result['total'] // len(allseries)))
+
+def bench_tracemalloc(allseries):
+    '''Measure the peak and retained allocations of each solve with tracemalloc.
+    The caches are kept between the series, as in a long running process.'''
+    lib.base.clearcache()
+    peaks = []
+    retained = []
+    
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    
+    for series in allseries:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        
+        solver = lib.Solver(series)
+        solver.generatelist(10)
+        del solver
+        
+        current, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+        retained.append(current - before)
+    
+    total = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    
+    worst = peaks.index(max(peaks))
+    print("Peak per solve:     %d bytes average, %d bytes max (%s)" % (
+          sum(peaks) // len(peaks), peaks[worst], ' '.join(allseries[worst])))
+    print("Retained per solve: %d bytes average, %d bytes max" % (
+          sum(retained) // len(retained), max(retained)))
+    print("Retained in total:  %d bytes" % total)
+
+def bench_import(repeat = 10):
+    '''Measure the startup cost: wall time of a new interpreter importing the library,
+    and the number of modules it has loaded.'''
+    for statement in ('pass', 'import lib', 'import lib; lib.Solver'):
+        code = statement + '; import sys; print(len(sys.modules))'
+        best = None
+        
+        for i in range(repeat):
+            output, t = timed(subprocess.check_output, [sys.executable, '-c', code])
+            best = t if best is None else min(best, t)
+        
+        print("%-24s %0.3f s, %s modules" % (statement + ':', best, output.decode().strip()))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument('files', nargs = '*', help = 'test case files, as for clitest.py')
+    parser.add_argument('-n', '--count', type = int, default = 1000,
+                        help = 'number of entries to generate for each series')
+    parser.add_argument('-m', '--memory', action = 'store_true',
+                        help = 'measure the memory used by the caches')
+    parser.add_argument('-t', '--tracemalloc', action = 'store_true',
+                        help = 'measure the allocations of each solve with tracemalloc')
+    parser.add_argument('-i', '--import', dest = 'startup', action = 'store_true',
+                        help = 'measure the time used for importing the library')
+    args = parser.parse_args()
+    
+    if args.startup:
+        bench_import()
+        sys.exit(0)
+    
+    if not args.files:
+        parser.error("no test case files given")
+    
+    allseries = []
+    for filename in args.files:
+        allseries += readseries(filename)
+    
+    print("%d series" % len(allseries))
+    
+    if args.memory:
+        bench_memory(allseries)
+    elif args.tracemalloc:
+        bench_tracemalloc(allseries)
+    else:
+        bench_generate(allseries, args.count)
@@ -10,6 +10,9 @@ cgitb.enable()
 
 import lib
 
+# Expensive searches are queued or done without the fallback when the server is busy
+lib.cost.admission = lib.cost.LoadPolicy()
+
 print('Content-Type: text/html; charset=utf-8')
 print()
 print()
@@ -71,11 +74,16 @@ except lib.UnsolvableException:
         <p>Tapahtui harvinainen poikkeus! Fiksu-Zizzo ei osannutkaan ratkaista sarjaasi.</p>
         <h1 style="color:#F00">Taisit huijata ja syöttää jotain puppua!</h1>''')
     footer()
+except lib.cost.OverloadedException:
+    print('''
+        <p>Zizzolla on juuri nyt liian kiire näin vaikean sarjan ratkaisemiseen.</p>
+        <h1 style="color:#F00">Yritä hetken päästä uudelleen!</h1>''')
+    footer()
 
 print('''<p>Annetut termit: %s<br/>''' % ', '.join(map(str,sarja)))
 print('''Seuraavat %d termiä:''' % maara)
 
-lst = mysolver.generatelist(maara)
+lst = mysolver.generatelist(maara, maxdigits = 1000)
 
 if max([len(s) for s in lst]) > 6:
     print('<ul>')
@@ -9,11 +9,32 @@ print s[:5]
 => ['A', 'B', 'C', 'D', 'E']
 '''
 
-from .combinedsolver import CombinedSolver as Solver
-from .tools import describe
-from .base import UnsolvableException
+import importlib
 
 __version__ = 'epsilon'
 
+# The solver modules are imported on first use, so that eg. a script that only
+# needs lib.alphabet doesn't pay for loading all of them.
+_lazy = {'Solver': ('combinedsolver', 'CombinedSolver'),
+         'describe': ('tools', 'describe'),
+         'UnsolvableException': ('base', 'UnsolvableException')}
+
+def __getattr__(name):
+    if name in _lazy:
+        module, attribute = _lazy[name]
+        value = getattr(importlib.import_module('.' + module, __name__), attribute)
+    else:
+        try:
+            value = importlib.import_module('.' + name, __name__)
+        except ModuleNotFoundError as e:
+            if e.name != __name__ + '.' + name:
+                raise
+            
+            raise AttributeError("module %r has no attribute %r" % (__name__, name)) from None
+    
+    globals()[name] = value
+    return value
+
 __all__ = ['Solver', 'describe', 'UnsolvableException',
-           'tools', 'base', 'alphabet']
+           'tools', 'base', 'alphabet', 'compiler', 'spec', 'stats', 'templates',
+           'cost', 'metrics', 'tracing', 'memory']
@@ -1,27 +1,181 @@
 # -*- coding: UTF-8 -*-
 
 import sys
+import heapq
+import bisect
+import itertools
+import threading
 from . import tools
+from . import stats
+
+numpy = None # Imported by _loadnumpy() when first needed, None if not installed
+_numpyloaded = False
 
 class UnsolvableException(Exception):
     '''This class cannot solve the series'''
 
 class Solver:
     '''Dummy class to allow isinstance(item, Solver)'''
+    __slots__ = ()
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        
+        if _observers:
+            _observe(cls)
+
+# Receivers of the search events, see addobserver()
+_observers = []
 
 def debug(message):
     sys.stderr.write("Debug: " + str(message) + "\n")
 
+class _State(threading.local):
+    '''State of the solving and generating in progress. Each thread has its own, so
+    that several threads can use the library at the same time. The caches of the
+    solvers are shared: the values stored in them are the same whichever thread
+    computes them first.
+    '''
+    maxdigits = None # Digit budget of the current generatelist() call, None if unlimited
+    topk = 1 # Number of alternatives kept by each selection, from top_k of the outermost one
+    allowed = None # Classes the selections are restricted to, see restricted()
+    hints = None # Old solvers when extending a series, see _extend()
+    hintsused = 0
+    depth = 0 # Number of selections in progress, see _leave()
+    lastseries = (None, None) # Last series list and its key, shared by nested selections
+    lastsignature = (None, None) # Same for the signature used by lib.stats
+    lastarray = (None, None) # The series last converted to an array, and the array
+    analyzing = None # Solver in analyze(), its calls to analyze() of a parent class are not events
+    stepper = None # The stepped search running in this thread, see BaseSelectSolver.steps()
+    admitted = False # In a search admitted by lib.cost, the nested ones aren't asked again
+    locks = 0 # Number of locked() sections the thread is in, a stepped search doesn't pause in them
+
+_state = _State()
+
+class BigNumber:
+    '''A generated number that has more digits than allowed by generatelist(). It is
+    kept as an exact formula, eg. 3^(2^20), instead of computing the digits. Sums and
+    products with other numbers give a formula of them, or only the approximate count
+    of digits if the formula gets long.
+    '''
+    __slots__ = ('formula', 'digits')
+    maxformula = 60
+    
+    def __init__(self, formula, digits):
+        self.formula = formula
+        self.digits = digits # Approximate count of decimal digits
+    
+    def __str__(self):
+        return self.formula
+    
+    def __repr__(self):
+        return 'BigNumber(%r)' % self.formula
+    
+    def _combine(self, left, operator, right, digits):
+        formula = _term(left) + operator + _term(right)
+        if len(formula) > self.maxformula:
+            formula = '<%.4g digits>' % digits
+        
+        return BigNumber(formula, digits)
+    
+    def __add__(self, other):
+        if not isinstance(other, (int, BigNumber)):
+            return NotImplemented
+        return self._combine(self, ' + ', other, max(self.digits, _digits(other)))
+    
+    def __radd__(self, other):
+        if not isinstance(other, int):
+            return NotImplemented
+        return self._combine(other, ' + ', self, max(self.digits, _digits(other)))
+    
+    def __sub__(self, other):
+        if not isinstance(other, (int, BigNumber)):
+            return NotImplemented
+        return self._combine(self, ' - ', other, max(self.digits, _digits(other)))
+    
+    def __rsub__(self, other):
+        if not isinstance(other, int):
+            return NotImplemented
+        return self._combine(other, ' - ', self, max(self.digits, _digits(other)))
+    
+    def __mul__(self, other):
+        if not isinstance(other, (int, BigNumber)):
+            return NotImplemented
+        return self._combine(self, '*', other, self.digits + _digits(other))
+    
+    def __rmul__(self, other):
+        if not isinstance(other, int):
+            return NotImplemented
+        return self._combine(other, '*', self, self.digits + _digits(other))
+    
+    def __neg__(self):
+        return BigNumber('-' + _term(self), self.digits)
+    
+    def __index__(self):
+        raise _OverBudget # Used as a count or an index by a string or list solver
+    
+    def __mod__(self, other):
+        raise _OverBudget
+
+class _OverBudget(Exception):
+    '''An entry can't be generated within the digit budget, eg. a string of 2^49
+    characters. generatelist() gives a placeholder for it.'''
+
+def text(value):
+    '''A number as a part of a string entry. The formula of a BigNumber is put in
+    brackets, to tell it apart from the other characters of the entry.'''
+    if value.__class__ is BigNumber and not value.formula.startswith('<'):
+        return '[' + value.formula + ']'
+    
+    return str(value)
+
+def length(value):
+    '''Check a number used as a length or a count by a string or list solver.
+    Within a digit budget, strings and lists may not be longer than it either.'''
+    maxdigits = _state.maxdigits
+    if maxdigits is not None and (value.__class__ is BigNumber or value > maxdigits):
+        raise _OverBudget
+    
+    return value
+
+def _cachekey(index):
+    '''Key of the generated entry at index in the cache of a solver. The entries
+    generated within a digit budget depend on it, so they are kept separately.'''
+    maxdigits = _state.maxdigits
+    if maxdigits is None:
+        return index
+    
+    return (index, maxdigits)
+
+def _digits(value):
+    '''Approximate count of decimal digits of an integer or a BigNumber.'''
+    if isinstance(value, BigNumber):
+        return value.digits
+    
+    return value.bit_length() * 0.30103 + 1
+
+def _term(value):
+    '''Formula of value as an operand of another formula.'''
+    text = str(value)
+    if ' ' in text or text.startswith('-'):
+        return '(' + text + ')'
+    
+    return text
+
 class GeneratingSolver(Solver):
     '''Handlers for __getitem__ and generatelist() and necessary __init__ stuff, but no code for actually analyzing a series.
     This is used to produce a solver-like interface for an already known series.
+    
+    All solver classes define __slots__, as thousands of solvers are kept in the
+    solving cache. The cache of generated values and the reverse solver are allocated
+    only when they are first needed.
     '''
+    __slots__ = ('cache', '_reversesolver')
     
     can_do_negative = True # Can generate(self, index) handle negative values for index?
     
     def __init__(self):
-        self.cache = {}
-        self._reversesolver = None
+        pass
     
     def generate(self, index):
         '''Generate series' value at index. Index >= 0, including the initial series.
@@ -31,10 +185,39 @@ class GeneratingSolver(Solver):
         '''
         return None
     
-    def generatelist(self, count):
-        '''Generate <count> next entries after the initial series and return them as a list.'''
+    def codegen(self, compiler):
+        '''Return generate(self, i) as a Python expression source for lib.compiler,
+        or None if the solver can not be expressed as one. Subsolvers are included
+        with compiler.call(solver, index) and other values with compiler.constant(value).
+        '''
+        return None
+    
+    def generatelist(self, count, maxdigits = None):
+        '''Generate <count> next entries after the initial series and return them as a list.
+        With maxdigits, numbers that would have more digits are not computed, but given as
+        BigNumber. Solvers that produce huge numbers check this before the arithmetic.
+        Strings and lists longer than maxdigits are given as a placeholder.
+        '''
         start = len(self.series)
-        return self[start : start + count]
+        if maxdigits is None:
+            return self[start : start + count]
+        
+        previous, _state.maxdigits = _state.maxdigits, maxdigits
+        try:
+            values = []
+            for index in range(start, start + count):
+                try:
+                    value = self[index]
+                    if isinstance(value, (str, list)) and len(value) > maxdigits:
+                        raise _OverBudget # Eg. joined from shorter parts
+                except _OverBudget:
+                    value = '<over %d characters>' % maxdigits
+                
+                values.append(value)
+            
+            return [v for v in values if v is not None]
+        finally:
+            _state.maxdigits = previous
     
     def reversesolver(self):
         '''Create a solver for solving at indexes < 0. This is required by some string solvers.
@@ -71,20 +254,23 @@ class GeneratingSolver(Solver):
             else:
                 start = 0
             
-            return [self[i] for i in range(start, key.stop, step) if self[i] is not None]
+            values = [self[i] for i in range(start, key.stop, step)]
+            return [v for v in values if v is not None]
         
         if not isinstance(key, int):
             raise IndexError
         
         if key < 0 and not self.can_do_negative:
-            if not self._reversesolver:
+            try:
+                reversesolver = self._reversesolver
+            except AttributeError:
                 try:
-                    self._reversesolver = self.reversesolver()
+                    reversesolver = self._reversesolver = self.reversesolver()
                 except UnsolvableException:
                     debug("Reversesolver for %s failed" % repr(self))
                     raise IndexError
             
-            return self._reversesolver[-1 - key]
+            return reversesolver[-1 - key]
         
         if key >= 0:
             try:
@@ -94,14 +280,33 @@ class GeneratingSolver(Solver):
             except AttributeError:
                 pass
         
-        if key not in self.cache:
-            self.cache[key] = self.generate(key)
+        try:
+            cache = self.cache
+        except AttributeError:
+            cache = self.cache = {}
         
-        return self.cache[key]
+        cachekey = _cachekey(key)
+        if cachekey not in cache:
+            cache[cachekey] = self.generate(key)
+        
+        return cache[cachekey]
 
 
 class BaseSolver(GeneratingSolver):
+    __slots__ = ('series', '_score', '_alternatives')
     minimum_entries = 1
+    maxscore = 1.0 # Upper bound for score(), lets selections skip solvers that can't win
+    
+    def __init_subclass__(cls, **kwargs):
+        '''Cache the result of score() in subclasses. The parameters of a solver do
+        not change after analyze(), and parent solvers call score() of their subsolvers
+        many times during the search.
+        '''
+        super().__init_subclass__(**kwargs)
+        
+        if 'score' in cls.__dict__:
+            cls.score = _cachedscore(cls.__dict__['score'])
+    
     def __init__(self, series):
         GeneratingSolver.__init__(self)
         
@@ -109,11 +314,34 @@ class BaseSolver(GeneratingSolver):
             raise UnsolvableException
         
         self.series = series
-        self.analyze()
+        if self.analyze() is False:
+            raise UnsolvableException
+    
+    @classmethod
+    def try_solve(cls, series):
+        '''Same as cls(series), but return None instead of raising UnsolvableException.
+        Most series can't be solved by most classes, so the search uses this to avoid
+        the cost of raising and catching thousands of exceptions.
+        '''
+        if len(series) < cls.minimum_entries:
+            return None
+        
+        solver = cls.__new__(cls)
+        solver.series = series
+        try:
+            if solver.analyze() is False:
+                return None
+        except UnsolvableException: # Solvers may still raise
+            return None
+        
+        return solver
     
     def analyze(self):
-        raise UnsolvableException
-
+        '''Find the parameters of the solver for self.series. Return False if the
+        series can't be solved.
+        '''
+        return False
+    
     def params(self):
         '''Return a dict with the parameters specific to this solver'''
         return {}
@@ -123,20 +351,46 @@ class BaseSolver(GeneratingSolver):
         Caching can be disabled with nocache, this way validation can be performed multiple times without
         messing up. Validating can also be done against some other series.
         '''
-        if nocache:
-            origcache = self.cache.copy()
-        
+        if not self.matches(start, nocache, series):
+            raise UnsolvableException
+    
+    def matches(self, start = 0, nocache = False, series = None):
+        '''Same as validate(), but return True or False instead of raising.'''
         if not series:
             series = self.series
         
+        if (len(series) - start >= vectorminimum and
+                type(self).generatearray is not BaseSolver.generatearray and
+                _loadnumpy() is not None):
+            # Most candidates fail at the first entries, so those are checked one by one
+            for i in range(start, start + 8):
+                if series[i] != self.generate(i):
+                    return False
+            
+            result = _vectormatches(self, start + 8, series)
+            if result is not None:
+                return result
+        
+        if nocache:
+            origcache = dict(getattr(self, 'cache', {}))
+        
         try:
             for i in range(start, len(series)):
                 if series[i] != self.generate(i):
-                    raise UnsolvableException
+                    return False
         finally:
             if nocache:
                 self.cache = origcache
-
+        
+        return True
+    
+    def generatearray(self, indexes):
+        '''Return generate(i) for a numpy int64 array of indexes >= 0, as an int64 array.
+        Used by matches() for long series, if numpy is available. Returns None if the
+        solver doesn't support it or the values could overflow int64.
+        '''
+        return None
+    
     def score(self):
         '''Return a score representing how probably a human would choose this solution.
         0.0 = Never
@@ -147,26 +401,85 @@ class BaseSolver(GeneratingSolver):
     def name(self):
         return self.__class__.__name__
 
+vectorminimum = 64 # Shorter series are validated faster without numpy
+
+def _loadnumpy():
+    '''Import numpy when the first long series is validated. Importing it takes
+    longer than solving most series, so lib doesn't import it at startup.
+    Returns None if it is not installed, then entries are validated one by one.'''
+    global numpy, _numpyloaded
+    if not _numpyloaded:
+        try:
+            import numpy
+        except ImportError:
+            pass
+        
+        _numpyloaded = True
+    
+    return numpy
+
+def _toarray(series):
+    '''Convert a list of integers to an int64 array, or return None if it is not possible.'''
+    for value in series:
+        if type(value) is not int:
+            return None
+    
+    try:
+        return numpy.array(series, dtype = numpy.int64)
+    except OverflowError:
+        return None
+
+def _vectormatches(solver, start, series):
+    '''Compare series[start:] with generatearray() of solver in one array operation.
+    Returns None if that is not possible, eg. for huge integers.
+    '''
+    if not _state.depth:
+        array = _toarray(series) # Not in a search, the list may have changed since
+    else:
+        if series is not _state.lastarray[0]: # All candidates validate the same list
+            _state.lastarray = (series, _toarray(series))
+        
+        array = _state.lastarray[1]
+    
+    if array is None:
+        return None
+    
+    generated = solver.generatearray(numpy.arange(start, len(series), dtype = numpy.int64))
+    if generated is None:
+        return None
+    
+    return bool(numpy.array_equal(generated, array[start:]))
+
+def _cachedscore(score):
+    def cachedscore(self):
+        try:
+            return self._score
+        except AttributeError:
+            self._score = score(self)
+            return self._score
+    
+    cachedscore.__doc__ = score.__doc__
+    return cachedscore
+
 class WrapperSolver(Solver):
-    '''Pass attribute access to another solver.'''
-    _solver = None
+    '''Pass attribute access to another solver. Subclasses store it in the slot _solver.'''
+    __slots__ = ()
     
     def __getattr__(self, name):
-        if self._solver:
-            return getattr(self._solver, name)
-        else:
-            raise AttributeError
+        if name == '_solver': # Not yet set
+            raise AttributeError(name)
+        
+        return getattr(self._solver, name)
     
     def __getitem__(self, key):
-        if self._solver:
-            return self._solver[key]
-        else:
-            raise AttributeError
+        return self._solver[key]
 
 class AlterSolver(WrapperSolver, GeneratingSolver):
     '''Modify values generated by other solvers. Replace generate(self, index) in subclass.
     The real solver can be accessed at self._solver
     '''
+    __slots__ = ('_solver',)
+    
     def __init__(self, solver):
         GeneratingSolver.__init__(self)
         self._solver = solver
@@ -174,65 +487,851 @@ class AlterSolver(WrapperSolver, GeneratingSolver):
     def generate(self, index):
         return self._solver.generate(index)
 
-class SelectSolver(WrapperSolver):
+_internalslots = ('cache', '_reversesolver', '_score', '_alternatives', '_generated', '_genindex',
+                  '_topk')
+_slotcache = {}
+
+def _slots(cls):
+    if cls not in _slotcache:
+        slots = []
+        for c in reversed(cls.__mro__):
+            for name in c.__dict__.get('__slots__', ()):
+                if name not in _internalslots:
+                    slots.append((name, c.__dict__[name]))
+        
+        _slotcache[cls] = slots
+    
+    return _slotcache[cls]
+
+def fieldnames(cls):
+    '''Return the names of the attributes fields() can return for instances of cls,
+    or None if they can have any attributes.'''
+    if any('__dict__' in c.__dict__ for c in cls.__mro__ if c is not object):
+        return None
+    
+    return [name for name, slot in _slots(cls)]
+
+def fields(solver):
+    '''Return the attributes of solver as a list of (name, value) pairs, not
+    including the caches. Unset attributes are left out.
+    '''
+    result = []
+    for name, slot in _slots(solver.__class__):
+        try:
+            result.append((name, slot.__get__(solver)))
+        except AttributeError:
+            pass # Not set
+    
+    try:
+        attributes = object.__getattribute__(solver, '__dict__') # Subclass without __slots__
+    except AttributeError:
+        attributes = {}
+    
+    result += [(name, value) for name, value in attributes.items() if name not in _internalslots]
+    
+    return result
+
+def copy(solver, /, **changes):
+    '''Return a copy of solver without the caches, with the fields given as keyword
+    arguments replaced. Lists are copied, subsolvers are shared.
+    '''
+    values = dict(fields(solver))
+    values.update(changes)
+    
+    cls = solver.__class__
+    result = cls.__new__(cls)
+    for name, value in values.items():
+        if isinstance(value, list):
+            value = list(value)
+        
+        setattr(result, name, value)
+    
+    return result
+
+def nodes(solver):
+    '''Yield solver and all its subsolvers, parent before its children.'''
+    yield solver
+    
+    for name, value in fields(solver):
+        if not isinstance(value, list):
+            value = [value]
+        
+        for s in value:
+            if isinstance(s, Solver):
+                yield from nodes(s)
+
+def unwrap(solver):
+    '''Return the solver chosen by SelectSolver or TresholdSelectSolver.'''
+    while isinstance(solver, BaseSelectSolver):
+        solver = solver._solver
+    
+    return solver
+
+def collapse(solver):
+    '''Replace the selection wrappers among the subsolvers of solver by the solvers
+    they selected. Name, params and generated values stay the same, but the accesses
+    don't have to go through WrapperSolver.__getattr__ anymore.
+    
+    The selected solvers have already been collapsed when they were selected, so the
+    walk stops at the wrappers and only goes through the subsolvers that were
+    constructed directly. Solvers with wrappers are copied instead of modified, as a
+    subsolver can be shared by the trees in the solving cache.
+    '''
+    changes = {}
+    for name, value in fields(solver):
+        if isinstance(value, list):
+            if [s for s in value if isinstance(s, Solver)]:
+                collapsed = [_selected(s) for s in value]
+                if [1 for a, b in zip(value, collapsed) if a is not b]:
+                    changes[name] = collapsed
+        
+        elif isinstance(value, Solver):
+            collapsed = _selected(value)
+            if collapsed is not value:
+                changes[name] = collapsed
+    
+    if not changes:
+        return solver
+    
+    return copy(solver, **changes)
+
+def _selected(solver):
+    '''The tree kept by a selection for solver. Trees from nested selections were
+    collapsed in them.'''
+    if isinstance(solver, BaseSelectSolver):
+        return unwrap(solver)
+    
+    return collapse(solver)
+
+class BaseSelectSolver(WrapperSolver):
+    '''Common parts of SelectSolver and TresholdSelectSolver. Subclasses define
+    _select(series), which stores the chosen solver in self._solver and returns
+    False if there is none.
+    '''
+    __slots__ = ('_solver', '_topk')
+    
+    def __init__(self, series, top_k = None):
+        if top_k is not None:
+            self._topk = top_k
+        
+        _state.depth += 1
+        try:
+            if top_k is not None:
+                found = _solvetopk(self, series, top_k)
+            else:
+                found = self._select(series)
+        finally:
+            _leave()
+        
+        if not found:
+            raise UnsolvableException
+    
+    @classmethod
+    def try_solve(cls, series):
+        '''Same as cls(series), but return None instead of raising UnsolvableException.'''
+        selection = cls.__new__(cls)
+        _state.depth += 1
+        try:
+            found = selection._select(series)
+        finally:
+            _leave()
+        
+        return selection if found else None
+    
+    @classmethod
+    def steps(cls, series, top_k = None, units = 100):
+        '''Generator solving series in bounded steps, for time-slicing several searches
+        in one thread. Each next() does at most units candidate solvers of the search,
+        the last one raises StopIteration with the solver as its value, or raises
+        UnsolvableException. Closing the generator abandons the search.
+        
+        The search itself is recursive, so it runs in a thread of its own that is
+        paused between the steps; only one of the threads runs at a time. Each
+        unfinished search holds its thread and stack until it ends or the generator
+        is closed or garbage collected, so a server should close the searches it
+        gives up on.
+        '''
+        return _steps(cls, series, top_k, units)
+    
+    def extend(self, newterms):
+        '''Return a solver for the series with newterms appended.'''
+        return _extend(self, newterms)
+    
+    def alternatives(self, top_k = None):
+        '''Yield the top_k best alternative solutions combined from the ones kept when
+        solving with top_k, best first. By default top_k is the one given when solving.'''
+        if top_k is None:
+            top_k = getattr(self, '_topk', None)
+        
+        for solver in alternativetrees(self._solver, top_k):
+            yield copy(self, _solver = solver)
+
+class SelectSolver(BaseSelectSolver):
     '''Select the solver with best score. Subclasses should redefine _solverclasses to include the solvers to be tried.'''
-    _solvingcache = {} # This instance of the dictionary is same for all instances and subclasses
+    __slots__ = ()
+    _solvingcache = {} # This instance of the dictionary is same for all instances and subclasses.
+                       # Series that could not be solved are stored as None.
     _solverclasses = []
-    def __init__(self, series):
-        tupleseries = (self.__class__, tools.recursivetuple(series)) # Lists are not hashable
+    def _select(self, series):
+        state = _state
+        
+        # Nested selections are called with the same list, so that they can share the
+        # key tuple in the cache. Series lists are not modified during the search, and
+        # the key is forgotten after it, see _leave().
+        if series is not state.lastseries[0]:
+            state.lastseries = (series, tools.recursivetuple(series)) # Lists are not hashable
+        
+        # The key is the exact series. Series like 2,4,6,8 and 5,7,9,11 can't share an
+        # entry: GeometricSolver, ExponentSolver etc. and the scores of AritmeticSolver
+        # depend on the values themselves, not only on their offset and scale. Solving
+        # an offset or scale normalized form only for the classes where it would be
+        # exact costs more than analyzing the short subseries again.
+        tupleseries = (self.__class__, state.lastseries[1])
+        if state.topk > 1:
+            tupleseries += (state.topk,)
+        if state.allowed is not None:
+            tupleseries += (state.allowed,)
         
         if tupleseries in self._solvingcache:
             self._solver = self._solvingcache[tupleseries]
-            return
+            return self._solver is not None # None if failed before
+        
+        hintsused = state.hintsused
+        solverclasses = self._solverclasses
+        hinted = ()
+        
+        if stats.active:
+            if series is not state.lastsignature[0]:
+                state.lastsignature = (series, stats.signature(series))
+            signature = state.lastsignature[1]
+            solverclasses = stats.order(self.__class__, signature, solverclasses)
+        
+        hint = _findhint(tupleseries[1])
+        if hint is not None and offers(self.__class__, hint.__class__):
+            if _predicts(hint, series):
+                state.hintsused += 1
+                self._solver = copy(hint, series = series)
+                return True
+            
+            # Search again only below the class that was selected before
+            hinted = [cls for cls in solverclasses if offers(cls, hint.__class__)][:1]
+            solverclasses = hinted + [cls for cls in solverclasses if cls not in hinted]
+        
+        # Equal scores are won by the class listed first in _solverclasses, whatever
+        # the order they are tried in. In top_k mode the bound is the k-th best score
+        # found so far, so the candidates that can't get among the top_k are skipped.
+        positions = _positions(self.__class__)
+        prune = state.topk == 1
+        recording = stats.recording
+        stepper = state.stepper
+        tried = []
         
         bestsolver = None
         bestscore = 0.
+        bestclass = None
+        found = []
+        scores = [] # Scores of found, ascending
         
-        for cls in self._solverclasses:
-            try:
-                solver = cls(series)
-            except UnsolvableException:
+        for cls in solverclasses:
+            position = positions[cls]
+            
+            if state.allowed is not None and not allowed(cls):
+                continue
+            
+            if stepper is not None:
+                stepper.checkpoint()
+            
+            if prune and bestsolver is not None:
+                bound = maxscore(cls)
+                if bound < bestscore or (bound == bestscore and position > positions[bestclass]):
+                    continue # Can't beat the best one
+            
+            elif len(scores) >= state.topk and maxscore(cls) < scores[-state.topk]:
+                continue # Can't beat the top_k best ones
+            
+            if recording:
+                start = stats.timer()
+            
+            solver = cls.try_solve(series)
+            
+            if recording:
+                tried.append((cls, stats.timer() - start))
+            
+            if solver is None:
                 continue
             
-            if solver.score() > bestscore:
+            score = solver.score()
+            if cls in hinted and score >= hint.score():
+                state.hintsused += 1
+                bestsolver = solver
+                break
+            
+            if state.topk > 1 and score > 0.:
+                found.append(solver)
+                bisect.insort(scores, score)
+            
+            if score > bestscore or (bestsolver is not None and score == bestscore and
+                                     position < positions[bestclass]):
                 bestsolver = solver
-                bestscore = solver.score()
+                bestscore = score
+                bestclass = cls
+        
+        if recording:
+            stats.record(self.__class__, signature, tried, bestclass)
         
         if not bestsolver:
-            raise UnsolvableException
+            if state.hintsused == hintsused:
+                self._solvingcache[tupleseries] = None
+            return False
+        
+        if found:
+            bestsolver = _keepalternatives(found)
+        else:
+            bestsolver = _selected(bestsolver)
         
         self._solver = bestsolver
-        self._solvingcache[tupleseries] = bestsolver
+        
+        if state.hintsused == hintsused: # Results found using hints could differ from a full search
+            self._solvingcache[tupleseries] = bestsolver
+        
+        return True
 
-class TresholdSelectSolver(WrapperSolver):
+class TresholdSelectSolver(BaseSelectSolver):
     '''Try faster solver first. If it doesn't match or has too slow score, try the slower one'''
+    __slots__ = ()
     _fastsolver = None
     _slowsolver = None
     _treshold = 0.0
     
-    def __init__(self, series):
-        self._solver = None
+    def _select(self, series, fallback = True):
+        fast = self._fastsolver.try_solve(series)
+        
+        self._solver = fast
+        slow = None
+        if fast is None or fast.score() < self._treshold:
+            if fallback and (_state.allowed is None or allowed(self._slowsolver)):
+                if _state.stepper is not None:
+                    _state.stepper.checkpoint()
+                
+                slow = self._slowsolver.try_solve(series)
+            
+            if slow is None and fast is None:
+                return False
+            
+            if slow is not None and (fast is None or slow.score() > fast.score()):
+                self._solver = slow
+        
+        if _state.topk > 1:
+            self._solver = _keepalternatives([s for s in (fast, slow) if s is not None])
+        else:
+            self._solver = _selected(self._solver)
+        
+        return True
+
+def allowed(cls):
+    '''Check if cls can give a solver of the classes the search is restricted to.'''
+    key = (cls, _state.allowed)
+    if key not in _allowedcache:
+        _allowedcache[key] = any(offers(cls, c) for c in _state.allowed)
+    
+    return _allowedcache[key]
+
+_allowedcache = {}
+
+def restricted(cls, series, classes):
+    '''Solve series with the selection class cls, trying only the solvers of the
+    given classes. This is much faster than the full search when the classes of the
+    solution can be guessed. Raises UnsolvableException if there is no such solution.
+    '''
+    previous, _state.allowed = _state.allowed, frozenset(classes)
+    try:
+        return cls(series)
+    finally:
+        _state.allowed = previous
+
+class _Abandoned(BaseException):
+    '''Raised in a stepped search that was closed, not caught by the solvers.'''
+
+class _Stepper:
+    '''Hands the control between a stepped search running in its own thread and
+    the generator of steps(), so that only one of them runs at a time. The search
+    thread gets the restrictions of the calling thread, the rest of _state starts
+    from the defaults.'''
+    def __init__(self, units):
+        self.units = units
+        self.count = 0
+        self.resumed = threading.Semaphore(0)
+        self.paused = threading.Semaphore(0)
+        self.abandoned = False
+        self.done = False
+    
+    def checkpoint(self):
+        '''Called by the search between candidates. Pauses after units of them.'''
+        self.count += 1
+        if self.count < self.units or _state.locks:
+            return
+        
+        self.count = 0
+        self.paused.release()
+        self.resumed.acquire()
+        
+        if self.abandoned:
+            raise _Abandoned
+    
+    def run(self, cls, series, top_k, allowed):
+        self.resumed.acquire()
+        _state.stepper = self
+        _state.allowed = allowed
+        
         try:
-            self._solver = self._fastsolver(series)
-        except UnsolvableException:
+            self.result = cls(series, top_k)
+        except _Abandoned:
             pass
+        except BaseException as e:
+            self.error = e
+        
+        self.done = True
+        self.paused.release()
+
+def _steps(cls, series, top_k, units):
+    stepper = _Stepper(units)
+    thread = threading.Thread(target = stepper.run, args = (cls, series, top_k, _state.allowed),
+                              daemon = True)
+    thread.start()
+    
+    try:
+        while True:
+            stepper.resumed.release()
+            stepper.paused.acquire()
+            
+            if stepper.done:
+                break
+            
+            yield
+    finally:
+        if not stepper.done: # Closed or garbage collected while paused
+            stepper.abandoned = True
+            stepper.resumed.release()
+        
+        thread.join()
+    
+    if hasattr(stepper, 'error'):
+        raise stepper.error
+    
+    return stepper.result
+
+class locked:
+    '''Context manager holding lock, during which a stepped search doesn't pause.
+    Otherwise a search paused while holding the lock could block the thread
+    that should resume it.'''
+    __slots__ = ('lock',)
+    
+    def __init__(self, lock):
+        self.lock = lock
+    
+    def __enter__(self):
+        self.lock.acquire()
+        _state.locks += 1
+    
+    def __exit__(self, *exc):
+        _state.locks -= 1
+        self.lock.release()
+
+_positioncache = {}
+
+def _positions(cls):
+    '''Positions of the candidates in the _solverclasses of a selection class.'''
+    if cls not in _positioncache:
+        _positioncache[cls] = dict((c, i) for i, c in reversed(list(enumerate(cls._solverclasses))))
+    
+    return _positioncache[cls]
+
+def maxscore(cls):
+    '''Upper bound for the score of the solvers that class cls can give.'''
+    if cls not in _maxscorecache:
+        if issubclass(cls, SelectSolver):
+            result = max(maxscore(c) for c in cls._solverclasses)
+        elif issubclass(cls, TresholdSelectSolver):
+            result = max(maxscore(cls._fastsolver), maxscore(cls._slowsolver))
+        else:
+            result = cls.maxscore
+        
+        _maxscorecache[cls] = result
+    
+    return _maxscorecache[cls]
+
+_maxscorecache = {}
+
+def offers(cls, target):
+    '''Check if the selection class cls can select a solver of class target.'''
+    key = (cls, target)
+    if key not in _offerscache:
+        if cls is target:
+            result = True
+        elif issubclass(cls, SelectSolver):
+            result = any(offers(c, target) for c in cls._solverclasses)
+        elif issubclass(cls, TresholdSelectSolver):
+            result = offers(cls._fastsolver, target) or offers(cls._slowsolver, target)
+        else:
+            result = False
         
-        if not self._solver or self._solver.score() < self._treshold:
+        _offerscache[key] = result
+    
+    return _offerscache[key]
+
+_offerscache = {}
+
+# While extending a solved series, _state.hints has the solvers of the old tree keyed
+# by their series. Selections on a longer version of a series try the old solver first.
+_hintscore = 0.5 # Solvers with lower score are just guesses, not worth keeping
+
+def _findhint(key):
+    '''Find the old solver for the longest prefix of the series key.'''
+    if not _state.hints:
+        return None
+    
+    for length in range(len(key) - 1, 0, -1):
+        if key[:length] in _state.hints:
+            return _state.hints[key[:length]]
+    
+    return None
+
+def _predicts(solver, series):
+    '''Check if solver generates the rest of series after its own series.'''
+    try:
+        for i in range(len(solver.series), len(series)):
+            if solver[i] != series[i]:
+                return False
+    except (IndexError, UnsolvableException):
+        return False
+    
+    return True
+
+def _extend(selection, newterms):
+    '''Extend a solved series: if the selected solver already generates newterms,
+    and its score is not just a guess, only the series is replaced. Otherwise the
+    series is solved again, but the selections whose old solver still predicts the
+    new terms are not searched, and the others first try again the class of the
+    old solver.
+    '''
+    solver = unwrap(selection)
+    series = list(solver.series) + list(newterms)
+    
+    if solver.score() >= _hintscore and _predicts(solver, series):
+        return copy(selection, _solver = copy(solver, series = series))
+    
+    hints = {}
+    for node in nodes(solver):
+        if isinstance(node, BaseSolver) and node.score() >= _hintscore:
+            hints.setdefault(tools.recursivetuple(node.series), node)
+    
+    _state.hints = hints
+    try:
+        return selection.__class__(series)
+    finally:
+        _state.hints = None
+
+def _solvetopk(selection, series, k):
+    previous, _state.topk = _state.topk, k
+    try:
+        return selection._select(series)
+    finally:
+        _state.topk = previous
+
+def _keepalternatives(solvers):
+    '''Return the best of solvers, with the top_k best solvers found by them and
+    by the nested selections stored in its _alternatives.
+    '''
+    alternatives = []
+    for solver in solvers:
+        solver = _selected(solver)
+        alternatives += getattr(solver, '_alternatives', [solver])
+    
+    if len(alternatives) > 1: # A single one needs no predictions
+        alternatives.sort(key = lambda s: -s.score()) # Keeps the order of equal scores
+        alternatives = list(itertools.islice(_distinct(alternatives), _state.topk))
+    
+    best = copy(alternatives[0]) # The same solver can be selected with other alternatives elsewhere
+    best._alternatives = alternatives
+    return best
+
+def _prediction(solver):
+    '''The next values generated by solver, to tell apart different solutions.
+    None if the solver fails to generate them.'''
+    start = len(solver.series)
+    try:
+        return tools.recursivetuple([solver[i] for i in range(start, start + max(start, 3))])
+    except (IndexError, TypeError, ValueError, ArithmeticError, UnsolvableException):
+        return None
+
+def _distinct(solvers):
+    '''Yield the first solver and the ones that predict different values than the
+    ones before them. Other solvers that fail to generate the values are left out.
+    '''
+    seen = set()
+    for solver in solvers:
+        prediction = _prediction(solver)
+        if not seen or (prediction is not None and prediction not in seen):
+            seen.add(prediction)
+            yield solver
+
+class _Stream:
+    '''Items of an iterator, kept in a list as they are consumed.'''
+    def __init__(self, iterator):
+        self.iterator = iterator
+        self.items = []
+    
+    def get(self, index):
+        '''Return the item at index or None if there aren't that many.'''
+        while len(self.items) <= index:
             try:
-                slow = self._slowsolver(series)
-            except UnsolvableException:
-                if not self._solver:
-                    raise UnsolvableException
-                else:
-                    return
-            
-            if not self._solver or slow.score() > self._solver.score():
-                self._solver = slow
+                self.items.append(next(self.iterator))
+            except StopIteration:
+                return None
+        
+        return self.items[index]
+    
+    def __iter__(self):
+        index = 0
+        while self.get(index) is not None:
+            yield self.items[index]
+            index += 1
+
+def _choices(solver, streams, limit):
+    '''Stream of the limit best trees for the place of solver in its parent, best
+    first. Trees predicting the same values as a better one are left out.'''
+    if id(solver) not in streams:
+        alternatives = getattr(solver, '_alternatives', [solver]) if isinstance(solver, BaseSolver) else [solver]
+        merged = heapq.merge(*[_variants(s, streams, limit, limit) for s in alternatives],
+                             key = lambda s: -s.score())
+        streams[id(solver)] = _Stream(itertools.islice(_distinct(merged), limit))
+    
+    return streams[id(solver)]
+
+def _variants(solver, streams, limit, count):
+    '''Yield solver with the count best combinations of the limit best alternatives
+    of each subsolver, best first, or all of them if count is None. The next
+    candidates are the best combinations so far with one subsolver replaced by the
+    next one of its alternatives. Only the candidates that can still be among the
+    count best are kept in the heap.
+    '''
+    places = []
+    for name, value in fields(solver):
+        if isinstance(value, list):
+            places += [(name, i) for i, s in enumerate(value) if isinstance(s, Solver)]
+        elif isinstance(value, Solver):
+            places.append((name, None))
+    
+    values = dict(fields(solver))
+    choices = [_choices(values[name] if i is None else values[name][i], streams, limit)
+               for name, i in places]
+    
+    def combine(indexes):
+        changes = {}
+        for (name, i), choice, index in zip(places, choices, indexes):
+            if i is None:
+                changes[name] = choice.get(index)
+            else:
+                changes.setdefault(name, list(values[name]))[i] = choice.get(index)
+        
+        return copy(solver, **changes)
+    
+    start = (0,) * len(places)
+    counter = itertools.count()
+    heap = [(-solver.score(), next(counter), start, solver)] # All first choices is solver itself
+    seen = set([start])
+    
+    remaining = count
+    while heap and remaining != 0:
+        score, n, indexes, tree = heapq.heappop(heap)
+        yield tree
+        
+        for p in range(len(places)):
+            following = indexes[:p] + (indexes[p] + 1,) + indexes[p + 1:]
+            if following in seen or choices[p].get(following[p]) is None:
+                continue
+            
+            seen.add(following)
+            tree = combine(following)
+            heapq.heappush(heap, (-tree.score(), next(counter), following, tree))
+        
+        if remaining is not None:
+            remaining -= 1
+            if len(heap) > 2 * remaining:
+                heap = heapq.nsmallest(remaining, heap) # A sorted list is a heap
+
+def _kept(solver):
+    '''The most alternatives kept by a selection in the tree of solver.'''
+    return max([len(getattr(node, '_alternatives', ())) for node in nodes(solver)] + [1])
+
+def alternativetrees(solver, top_k = None):
+    '''Yield the top_k best solver trees that can be combined from the alternatives
+    kept when solving with top_k, best first. The first one is solver itself. Trees
+    that predict the same values as a better one are left out. By default top_k is
+    the number of alternatives kept by the selections.
+    '''
+    solver = unwrap(solver)
+    if top_k is None:
+        top_k = _kept(solver)
+    
+    # All combinations of the subsolvers are candidates at the top, as the ones
+    # predicting the same values are left out
+    streams = {}
+    alternatives = getattr(solver, '_alternatives', [solver])
+    merged = heapq.merge(*[_variants(s, streams, top_k, None) for s in alternatives],
+                         key = lambda s: -s.score())
+    return itertools.islice(_distinct(merged), top_k)
+
+def _leave():
+    '''End a selection. The series lists are not modified during the search, so
+    the nested selections find their keys by the identity of the list. After the
+    outermost one the caller may modify the list, so they are forgotten.'''
+    state = _state
+    state.depth -= 1
+    if not state.depth:
+        state.lastseries = state.lastsignature = state.lastarray = (None, None)
 
 def clearcache():
     '''Clear the internal solving cache, that is persistent for the whole session. This
     function is useful only when timing execution speed.
     '''
-    SelectSolver._solvingcache = {}
+    SelectSolver._solvingcache.clear() # The same dict, addobserver() may have replaced it
+    _state.lastseries = (None, None)
+    _state.lastsignature = (None, None)
+
 
 
+class Observer:
+    '''Base class for the receivers of the search events, see addobserver().
+    Used by lib.metrics and lib.tracing.
+    '''
+    def begin(self, solver, series):
+        '''Analyzing series with solver starts. For the selections, this is the search.'''
+    
+    def end(self, solver, success):
+        '''Analyzing with solver ended, with a solution if success is set.'''
+    
+    def generated(self, solver):
+        '''solver.generate() was called.'''
+    
+    def validated(self, solver):
+        '''solver.matches() or validate() was called.'''
+    
+    def cachelookup(self, cls, hit):
+        '''An entry was looked up in the cache of generated entries of a cls solver,
+        or a series in the solving cache of the selection class cls.'''
+
+def addobserver(observer):
+    '''Send the search events to observer. While there are observers, the methods
+    of the solver classes are replaced by versions that send the events, so there
+    is no overhead without them. Classes defined later are handled too.
+    '''
+    if not _observers:
+        for cls in set(_subclasses(Solver)):
+            _observe(cls)
+        
+        _replace(BaseSolver, 'matches', _observedmatches)
+        _replace(GeneratingSolver, '__getitem__', _observedgetitem)
+        SelectSolver._solvingcache = _ObservedCache(SelectSolver._solvingcache)
+    
+    _observers.append(observer)
+
+def removeobserver(observer):
+    '''Stop sending the events to observer, and restore the methods after the last one.'''
+    _observers.remove(observer)
+    
+    if not _observers:
+        SelectSolver._solvingcache = dict(SelectSolver._solvingcache)
+        for (cls, name), method in _originalmethods.items():
+            setattr(cls, name, method)
+        
+        _originalmethods.clear()
+
+_originalmethods = {} # (class, method name) => the method replaced while there are observers
+
+def _subclasses(cls):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        yield from _subclasses(subclass)
+
+def _replace(cls, name, wrapper):
+    method = cls.__dict__[name]
+    _originalmethods[(cls, name)] = method
+    setattr(cls, name, wrapper(method))
+
+def _observe(cls):
+    '''Replace the methods that cls defines itself.'''
+    for name, wrapper in (('analyze', _observedanalyze), ('_select', _observedanalyze),
+                          ('generate', _observedgenerate)):
+        if name in cls.__dict__:
+            _replace(cls, name, wrapper)
+
+def _observedanalyze(method):
+    def analyze(self, *args):
+        if self is _state.analyzing:
+            return method(self, *args)
+        
+        series = args[0] if args else self.series # _select(series) or analyze()
+        for observer in _observers:
+            observer.begin(self, series)
+        
+        outer, _state.analyzing = _state.analyzing, self
+        result = False
+        try:
+            result = method(self, *args)
+        finally:
+            _state.analyzing = outer
+            for observer in reversed(_observers):
+                observer.end(self, result is not False)
+        
+        return result
+    
+    return analyze
+
+def _observedgenerate(method):
+    def generate(self, index):
+        for observer in _observers:
+            observer.generated(self)
+        
+        return method(self, index)
+    
+    return generate
+
+def _observedmatches(method):
+    def matches(self, *args, **kwargs):
+        for observer in _observers:
+            observer.validated(self)
+        
+        return method(self, *args, **kwargs)
+    
+    return matches
+
+def _observedgetitem(method):
+    def __getitem__(self, key):
+        if not isinstance(key, int):
+            return method(self, key)
+        
+        cache = getattr(self, 'cache', {})
+        cachekey = _cachekey(key)
+        known = cachekey in cache
+        value = method(self, key)
+        
+        if known or cachekey in getattr(self, 'cache', cache):
+            for observer in _observers:
+                observer.cachelookup(self.__class__, known)
+        
+        return value
+    
+    return __getitem__
+
+class _ObservedCache(dict):
+    '''The solving cache of the selections, sending the lookups to the observers.
+    The keys start with the selection class.'''
+    __slots__ = ()
+    
+    def __contains__(self, key):
+        found = dict.__contains__(self, key)
+        for observer in _observers:
+            observer.cachelookup(key[0], found)
+        
+        return found
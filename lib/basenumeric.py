@@ -11,17 +11,30 @@ import math
 
 
 class AritmeticSolver(base.BaseSolver):
+    __slots__ = ('first', 'difference')
     minimum_entries = 2
     can_do_negative = True
     
     def analyze(self):
         self.difference = self.series[1] - self.series[0]
         self.first = self.series[0]
-        self.validate(start = 2)
+        return self.matches(start = 2)
     
     def generate(self, index):
         return self.first + self.difference * index
     
+    def generatearray(self, indexes):
+        if abs(self.first) + abs(self.difference) * int(indexes[-1]) >= 2 ** 62:
+            return None
+        
+        return self.first + self.difference * indexes
+    
+    def codegen(self, compiler):
+        if self.difference == 0:
+            return repr(self.first)
+        
+        return "%r + %r * i" % (self.first, self.difference)
+    
     def score(self):
         if len(self.series) == 2: # There wasn't enough entries to perform real validation
             if self.difference in [-1,0,1]:
@@ -43,6 +56,8 @@ class FractionAritmeticSolver(base.BaseSolver):
     '''Solve aritmetic series with fractional addition.
     For example 1,1,2,2,3,3 => difference = 1/2
     '''
+    __slots__ = ('first', 'difference', 'period')
+    maxscore = 0.6
     minimum_entries = 3
     can_do_negative = True
     
@@ -54,14 +69,23 @@ class FractionAritmeticSolver(base.BaseSolver):
                 self.period = i
                 break
         else:
-            raise base.UnsolvableException
+            return False
         
         self.first = self.series[0]
-        self.validate(start = i)
+        return self.matches(start = i)
     
     def generate(self, index):
         return self.first + self.difference * (index // self.period)
     
+    def generatearray(self, indexes):
+        if abs(self.first) + abs(self.difference) * int(indexes[-1]) >= 2 ** 62:
+            return None
+        
+        return self.first + self.difference * (indexes // self.period)
+    
+    def codegen(self, compiler):
+        return "%r + %r * (i // %r)" % (self.first, self.difference, self.period)
+    
     def score(self):
         if len(self.series) <= self.period * 2 + 1:
             return 0.1
@@ -73,12 +97,14 @@ class FractionAritmeticSolver(base.BaseSolver):
                 'first': self.first}
 
 class GeometricSolver(base.BaseSolver):
+    __slots__ = ('first', 'quotient', 'divide')
+    maxscore = 0.8
     minimum_entries = 2
     can_do_negative = True
     
     def analyze(self):
         if self.series[0] == 0: # Protect against divide-by-zero
-            raise base.UnsolvableException
+            return False
         
         self.first = self.series[0]
         
@@ -91,9 +117,9 @@ class GeometricSolver(base.BaseSolver):
             self.quotient = self.series[0] // self.series[1]
         
         else:
-            raise base.UnsolvableException
+            return False
         
-        self.validate(start = 2)
+        return self.matches(start = 2)
     
     def generate(self, index):
         if self.divide:
@@ -107,8 +133,30 @@ class GeometricSolver(base.BaseSolver):
             
             return self.first // divisor
         else:
+            if base._state.maxdigits is not None and abs(self.quotient) > 1:
+                digits = math.log10(abs(self.first)) + index * math.log10(abs(self.quotient))
+                if digits > base._state.maxdigits:
+                    formula = "%s^%d" % (base._term(self.quotient), index)
+                    if self.first != 1:
+                        formula = "%d*%s" % (self.first, formula)
+                    
+                    return base.BigNumber(formula, digits)
+            
             return self.first * (self.quotient ** index)
     
+    def generatearray(self, indexes):
+        if self.divide or self.first.bit_length() + self.quotient.bit_length() * int(indexes[-1]) > 62:
+            return None
+        
+        return self.first * self.quotient ** indexes
+    
+    def codegen(self, compiler):
+        generate = compiler.constant(self.generate) # Handles the divisions
+        if self.divide:
+            return "%s(i) if i > 0 else %r * %r ** -i" % (generate, self.first, self.quotient)
+        else:
+            return "%r * %r ** i if i >= 0 else %s(i)" % (self.first, self.quotient, generate)
+    
     def score(self):
         if len(self.series) == 2:
             if self.quotient == 2:
@@ -131,6 +179,8 @@ class GeometricSolver(base.BaseSolver):
 
 class OffsetGeometricSolver(base.BaseSolver):
     '''Geometric series with constant offset'''
+    __slots__ = ('offset', 'solver')
+    maxscore = 0.4
     minimum_entries = 4
     can_do_negative = True
     
@@ -145,14 +195,18 @@ class OffsetGeometricSolver(base.BaseSolver):
         try:
             self.offset = (a1 * a3 - a2 ** 2) // (a3 - 2 * a2 + a1)
         except ZeroDivisionError:
-            raise base.UnsolvableException
+            return False
         
         series = [n - self.offset for n in self.series]
-        self.solver = GeometricSolver(series)
+        self.solver = GeometricSolver.try_solve(series)
+        return self.solver is not None
     
     def generate(self, index):
         return self.solver[index] + self.offset
     
+    def codegen(self, compiler):
+        return "%s + %r" % (compiler.call(self.solver), self.offset)
+    
     def score(self):
         return self.solver.score() * 0.4
     
@@ -162,6 +216,8 @@ class OffsetGeometricSolver(base.BaseSolver):
         return result
 
 class RecurringSolver(base.BaseSolver):
+    __slots__ = ('length',)
+    maxscore = 0.8
     minimum_entries = 3
     can_do_negative = True
     
@@ -170,19 +226,30 @@ class RecurringSolver(base.BaseSolver):
         # For example 1,2,3,1,2,3,1,2,3 is recurring with both 3 and 6
         
         for self.length in range(2, len(self.series)):
-            try:
-                self.validate(start = self.length, nocache = True)
-            except base.UnsolvableException:
-                continue
-            
-            break
+            if self.matches(start = self.length, nocache = True):
+                return True
         
-        else:
-            raise base.UnsolvableException
+        return False
     
     def generate(self, index):
         return self.series[index % self.length]
     
+    def generatearray(self, indexes):
+        values = self.series[:self.length]
+        for value in values:
+            if type(value) is not int:
+                return None
+        
+        try:
+            values = base.numpy.array(values, dtype = base.numpy.int64)
+        except OverflowError:
+            return None
+        
+        return values[indexes % self.length]
+    
+    def codegen(self, compiler):
+        return "%s[i %% %d]" % (compiler.constant(self.series[:self.length]), self.length)
+    
     def score(self):
         # How many entries did we have for checking whether it is recurring?
         proof = len(self.series) - self.length
@@ -203,17 +270,33 @@ class ExponentSolver(base.BaseSolver):
     '''Each value is its index raised to some exponent. Internal indexes start
     from zero, but starting from one is more natural for humans.
     '''
+    __slots__ = ('exponent',)
+    maxscore = 0.6
     minimum_entries = 3
     def analyze(self):
         if self.series[-1] <= 0:
-            raise base.UnsolvableException # Avoid math problems
+            return False # Avoid math problems
         
         self.exponent = int(math.log(self.series[-1]) / math.log(len(self.series))) # Calculate from the last entry
-        self.validate()
+        return self.matches()
     
     def generate(self, index):
+        if base._state.maxdigits is not None and index > 0:
+            digits = self.exponent * math.log10(index + 1)
+            if digits > base._state.maxdigits:
+                return base.BigNumber("%d^%d" % (index + 1, self.exponent), digits)
+        
         return (index + 1) ** self.exponent
     
+    def generatearray(self, indexes):
+        if self.exponent * (int(indexes[-1]) + 1).bit_length() > 62:
+            return None
+        
+        return (indexes + 1) ** self.exponent
+    
+    def codegen(self, compiler):
+        return "(i + 1) ** %r" % self.exponent
+    
     def score(self):
         if self.exponent == 2:
             return 0.6
@@ -223,7 +306,67 @@ class ExponentSolver(base.BaseSolver):
     def params(self):
         return {'exponent': self.exponent}
 
+class PolynomialSolver(base.BaseSolver):
+    '''Values of a polynomial of the index, found from the table of differences:
+    0,1,5,14,30,55 => differences 1,4,9,16,25 => 3,5,7,9 => 2,2,2 (degree 3).
+    Any index, also negative, is evaluated with Newton's forward difference
+    formula, without recursion to the previous entries.
+    '''
+    __slots__ = ('differences',)
+    maxscore = 0.3
+    minimum_entries = 5
+    can_do_negative = True
+    maxdegree = 10 # The table is quadratic in the entries, with growing integers
+    
+    def analyze(self):
+        for value in self.series:
+            if type(value) is not int:
+                return False
+        
+        # The first entries of each row of the table are the coefficients of
+        # the Newton form. The last row must be constant with at least 3 entries.
+        # The table is made of the entries needed for the highest degree, a
+        # polynomial of at most that degree through them is unique, and the rest
+        # are only validated.
+        self.differences = []
+        row = self.series[:self.maxdegree + 3]
+        while len(row) >= 3:
+            self.differences.append(row[0])
+            if row.count(row[0]) == len(row):
+                if len(self.differences) < 3:
+                    return False # Degree 2 or more, lower ones are aritmetic
+                
+                return self.matches(start = self.maxdegree + 3)
+            
+            row = [b - a for a, b in zip(row, row[1:])]
+        
+        return False
+    
+    def generate(self, index):
+        result = 0
+        binomial = 1 # index choose j
+        for j, difference in enumerate(self.differences):
+            result += binomial * difference
+            binomial = binomial * (index - j) // (j + 1)
+        
+        return result
+    
+    def codegen(self, compiler):
+        return "%s(i)" % compiler.constant(self.generate)
+    
+    def score(self):
+        # Lower than SumSolver and ExponentSolver for the same series
+        if len(self.series) - len(self.differences) >= 3:
+            return 0.3 / (len(self.differences) - 2)
+        else:
+            return 0.05
+    
+    def params(self):
+        return {'degree': len(self.differences) - 1,
+                'differences': self.differences}
+
 class BaseNumericSolver(base.SelectSolver):
+    __slots__ = ()
     _solverclasses = [AritmeticSolver, FractionAritmeticSolver,
                       GeometricSolver, OffsetGeometricSolver,
                       RecurringSolver, ExponentSolver]
@@ -236,20 +379,46 @@ if __name__ == '__main__':
     
     a = GeometricSolver([1,2,4])
     assert a.generatelist(2) == [8,16]
+    assert str(a.generatelist(40, maxdigits = 10)[-1]) == '2^42'
     
     a = OffsetGeometricSolver([2,3,5,9])
     assert a.generatelist(2) == [17,33]
+    assert str(a.generatelist(40, maxdigits = 10)[-1]) == '2^43 + 1'
+    
+    a = PolynomialSolver([0,1,5,14,30,55])
+    assert a.generatelist(2) == [91,140]
+    assert a[-1] == 0 and a[-2] == -1
+    assert PolynomialSolver.try_solve([1,2,3,4,5]) is None # Aritmetic
+    assert PolynomialSolver.try_solve([i ** 10 for i in range(30)]).generatelist(1) == [30 ** 10]
+    assert PolynomialSolver.try_solve([i ** 11 for i in range(30)]) is None # Over maxdegree
+    assert PolynomialSolver.try_solve([i * i for i in range(30)] + [0]) is None
     
     a = RecurringSolver([1,2,1,2])
     assert a.generatelist(2) == [1,2]
     assert a[-5] == 2
     
-    try:
-        a = BaseNumericSolver([3,1,4,1,5])
-    except base.UnsolvableException:
-        pass
-    else:
-        raise AssertionError
+    assert RecurringSolver.try_solve([1,2,3,4]) is None
+    
+    # Long series are validated with numpy if it is available, imported only for them
+    assert not base._numpyloaded
+    a = AritmeticSolver(list(range(5, 1000, 3)))
+    assert base._numpyloaded
+    assert a.generatelist(1) == [1001]
+    assert RecurringSolver([1,2,3] * 100).length == 3
+    assert GeometricSolver.try_solve([3 ** i for i in range(200)]) is not None # Beyond int64
+    assert ExponentSolver.try_solve([i * i for i in range(1, 100)] + [1]) is None
+    assert GeometricSolver.try_solve([0,1,2]) is None
+    assert BaseNumericSolver.try_solve([3,1,4,1,5]) is None
+    
+    for i in range(2): # Second time the failure comes from the cache
+        try:
+            a = BaseNumericSolver([3,1,4,1,5])
+        except base.UnsolvableException:
+            pass
+        else:
+            raise AssertionError
+    
+    assert base.SelectSolver._solvingcache[(BaseNumericSolver, (3,1,4,1,5))] is None
     
     a = BaseNumericSolver([2,4,8,16])
     assert a.generatelist(2) == [32,64]
@@ -7,19 +7,25 @@ from . import alphabet
 
 class SingleCharSolver(base.BaseSolver):
     '''Strings consisting of a single character'''
+    __slots__ = ('solver',)
     can_do_negative = True
     
     def analyze(self):
         for s in self.series:
             if len(s) != 1:
-                raise base.UnsolvableException
+                return False
         
         numseries = [alphabet.ord(s[0]) for s in self.series]
-        self.solver = complexnumeric.CombinedNumericSolver(numseries)
+        self.solver = complexnumeric.CombinedNumericSolver.try_solve(numseries)
+        return self.solver is not None
     
     def generate(self, index):
         return alphabet.chr(self.solver[index])
     
+    def codegen(self, compiler):
+        return "%s[%s %% %d]" % (compiler.constant(alphabet.alphabet), compiler.call(self.solver),
+                                 len(alphabet.alphabet))
+    
     def score(self):
         return self.solver.score()
     
@@ -28,6 +34,7 @@ class SingleCharSolver(base.BaseSolver):
 
 class SameCharSolver(base.BaseSolver):
     '''Strings with single character and varying length. A BB CCC DDDD etc.'''
+    __slots__ = ('charsolver', 'lengthsolver')
     can_do_negative = True
     
     def analyze(self):
@@ -36,16 +43,23 @@ class SameCharSolver(base.BaseSolver):
         for s in self.series:
             for char in s:
                 if char != s[0]:
-                    raise base.UnsolvableException # All characters of an entry should be equal
+                    return False # All characters of an entry should be equal
             
             charseries.append(s[0])
             lengthseries.append(len(s))
         
-        self.charsolver = SingleCharSolver(charseries)
-        self.lengthsolver = complexnumeric.CombinedNumericSolver(lengthseries)
+        self.charsolver = SingleCharSolver.try_solve(charseries)
+        if self.charsolver is None:
+            return False
+        
+        self.lengthsolver = complexnumeric.CombinedNumericSolver.try_solve(lengthseries)
+        return self.lengthsolver is not None
     
     def generate(self, index):
-        return self.charsolver[index] * self.lengthsolver[index]
+        return self.charsolver[index] * base.length(self.lengthsolver[index])
+    
+    def codegen(self, compiler):
+        return "%s * %s" % (compiler.call(self.charsolver), compiler.call(self.lengthsolver))
     
     def score(self):
         return self.charsolver.score() * self.lengthsolver.score()
@@ -56,6 +70,8 @@ class SameCharSolver(base.BaseSolver):
 
 class CharRepeatSolver(base.BaseSolver):
     '''A, AAB, AAABBC => [A] [A,B] [A,B,C] and [1] [2,1] [3,2,1]'''
+    __slots__ = ('charlistsolver', 'countsolver')
+    maxscore = 0.4
     can_do_negative = True
     
     def analyze(self):
@@ -67,18 +83,29 @@ class CharRepeatSolver(base.BaseSolver):
             charlistseries.append([s[0] for s in blocks])
             countseries.append([len(s) for s in blocks])
         
-        self.charlistsolver = listnumeric.CharListSolver(charlistseries)
-        self.countsolver = listnumeric.CombinedListSolver(countseries)
+        self.charlistsolver = listnumeric.CharListSolver.try_solve(charlistseries)
+        if self.charlistsolver is None:
+            return False
+        
+        self.countsolver = listnumeric.CombinedListSolver.try_solve(countseries)
+        return self.countsolver is not None
     
     def generate(self, index):
         chars = self.charlistsolver[index]
         counts = self.countsolver[index]
+        base.length(sum(counts))
         result = ""
         for i in range(len(chars)):
             result += chars[i] * counts[i]
         
         return result
     
+    def codegen(self, compiler):
+        chars, counts, i = compiler.variable(), compiler.variable(), compiler.variable()
+        return "''.join([%s[%s] * %s[%s] for %s in [%s] for %s in [%s] for %s in range(len(%s))])" % (
+               chars, i, counts, i, chars, compiler.call(self.charlistsolver),
+               counts, compiler.call(self.countsolver), i, chars)
+    
     def score(self):
         return self.charlistsolver.score() * self.countsolver.score() * 0.4
     
@@ -91,23 +118,44 @@ class YSeriesSolver(base.BaseSolver):
     ABCDEF
     BCDEFG each char + 1
     CDEFGH each char + 1
+    
+    Identical columns are solved once and share the solver. SingleCharSolver is
+    not a selection, so the solving cache only keeps the numeric solver below it:
+    without sharing, each copy of a column would be converted to numbers, looked
+    up and validated again, and would add its own SingleCharSolver to the tree.
     '''
+    __slots__ = ('solvers',)
+    maxscore = 0.8
     def analyze(self):
         stringlen = len(self.series[0])
         for s in self.series:
             if len(s) != stringlen:
-                raise base.UnsolvableException
+                return False
         
+        columns = {}
         self.solvers = []
-        for i in range(stringlen):
-            charseries = [s[i] for s in self.series]
-            solver = SingleCharSolver(charseries)
+        for column in zip(*self.series):
+            if column not in columns:
+                columns[column] = SingleCharSolver.try_solve(list(column))
+            
+            solver = columns[column]
+            if solver is None:
+                return False
+            
             self.solvers.append(solver)
+        
+        return True
     
     def generate(self, index):
         chars = [solver[index] for solver in self.solvers]
         return ''.join(chars)
     
+    def codegen(self, compiler):
+        if not self.solvers:
+            return "''"
+        
+        return ' + '.join([compiler.call(solver) for solver in self.solvers])
+    
     def score(self):
         score = 0.80
         for solver in self.solvers:
@@ -129,6 +177,7 @@ class XSeriesSolver(base.BaseSolver):
     BCDEFG lefttrim + 1, length + 0
     CDEFGH lefttrim + 1, length + 0
     '''
+    __slots__ = ('charsolver', 'trimsolver', 'lengthsolver')
     def get_wholestring(self):
         '''Algorithm for finding out the whole string from series entries.
         Focuses on the common part of the individual entries.
@@ -152,7 +201,9 @@ class XSeriesSolver(base.BaseSolver):
     def analyze(self):
         wholestring = self.get_wholestring()
         charseries = list(wholestring)
-        self.charsolver = SingleCharSolver(charseries)
+        self.charsolver = SingleCharSolver.try_solve(charseries)
+        if self.charsolver is None:
+            return False
         
         lefttrims = []
         lengths = []
@@ -160,20 +211,30 @@ class XSeriesSolver(base.BaseSolver):
         for s in self.series:
             lefttrim = wholestring.find(s)
             if lefttrim == -1:
-                raise base.UnsolvableException
+                return False
             
             lefttrims.append(lefttrim)
             lengths.append(len(s))
         
-        self.trimsolver = complexnumeric.CombinedNumericSolver(lefttrims)
-        self.lengthsolver = complexnumeric.CombinedNumericSolver(lengths)
-
+        self.trimsolver = complexnumeric.CombinedNumericSolver.try_solve(lefttrims)
+        if self.trimsolver is None:
+            return False
+        
+        self.lengthsolver = complexnumeric.CombinedNumericSolver.try_solve(lengths)
+        return self.lengthsolver is not None
+    
     def generate(self, index):
         trim = self.trimsolver[index]
-        length = self.lengthsolver[index]
+        length = base.length(self.lengthsolver[index])
         chars = [self.charsolver[i] for i in range(trim, trim+length)]
         return ''.join(chars)
     
+    def codegen(self, compiler):
+        i, trim = compiler.variable(), compiler.variable()
+        return "''.join([%s for %s in [%s] for %s in range(%s, %s + %s)])" % (
+               compiler.call(self.charsolver, i), trim, compiler.call(self.trimsolver),
+               i, trim, trim, compiler.call(self.lengthsolver))
+    
     def score(self):
         return self.charsolver.score() * self.trimsolver.score() * self.lengthsolver.score()
 
@@ -187,10 +248,12 @@ class ConcatenatedXSeriesSolver(XSeriesSolver):
     Simply concatenates all entries.
     ['A', 'B', 'C'] => 'ABC'.
     '''
+    __slots__ = ()
     def get_wholestring(self):
         return ''.join(self.series)
 
 class BaseStringSolver(base.SelectSolver):
+    __slots__ = ()
     _solverclasses = [SingleCharSolver, SameCharSolver, CharRepeatSolver, 
                       YSeriesSolver, XSeriesSolver, basenumeric.RecurringSolver,
                       ConcatenatedXSeriesSolver]
@@ -204,6 +267,11 @@ if __name__ == '__main__':
     a = BaseStringSolver(['AZ', 'BY', 'CX'])
     assert a.generatelist(2) == ['DW', 'EV']
     
+    a = YSeriesSolver(['AXAB', 'AYAC', 'AZAD'])
+    assert a.generatelist(1) == ['A0AE']
+    assert a.solvers[0] is a.solvers[2] # Identical columns share the solver
+    assert a.analyze() is True
+    
     a = CharRepeatSolver(['A', 'AAB', 'AAABBC'])
     assert a.generatelist(2) == ['AAAABBBCCD', 'AAAAABBBBCCCDDE']
     
@@ -213,5 +281,18 @@ if __name__ == '__main__':
     a = ConcatenatedXSeriesSolver(['A', 'BC', 'DEF', 'GHIJ'])
     assert a.generatelist(2) == ['KLMNO', 'PQRSTU']
     
+    # Strings over the digit budget are not built
+    a = SameCharSolver(['A', 'AA', 'AAAA'])
+    assert a.generatelist(25, maxdigits = 5)[-1] == '<over 5 characters>'
+    assert a.generatelist(50, maxdigits = 50)[:4] == ['A' * 8, 'A' * 16, 'A' * 32, '<over 50 characters>']
+    
+    a = SameCharSolver(['S', 'SS', 'SSS'])
+    a.generatelist(10)
+    assert a.generatelist(10, maxdigits = 6)[-1] == '<over 6 characters>' # Also when in the cache
+    
+    from .combinedsolver import CombinedSolver
+    a = CombinedSolver(['AB', 'ABAB', 'ABABABAB'])
+    assert a.generatelist(25, maxdigits = 5)[-1] == '<over 5 characters>'
+    
     print("OK")
 
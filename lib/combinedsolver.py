@@ -1,6 +1,8 @@
 from . import base
 from . import tools
 from . import alphabet
+from . import templates
+from . import cost
 
 from . import basenumeric
 from . import complexnumeric
@@ -12,27 +14,29 @@ CombinedNumericSolver = complexnumeric.CombinedNumericSolver
 
 class ConstantZeroPaddingSolver(base.BaseSolver):
     '''An integer series padded to a specific width using zeros.'''
+    __slots__ = ('zerolength', 'numsolver')
     def analyze(self):
         withzeros = [s for s in self.series if s.startswith('0')]
         
         if not withzeros:
-            raise base.UnsolvableException # None have zeros
+            return False # None have zeros
         
         self.zerolength = len(withzeros[0])
         for s in withzeros[1:]:
             if len(s) != self.zerolength:
-                raise base.UnsolvableException # Non-constant padding
+                return False # Non-constant padding
         
         for s in self.series:
             if s not in withzeros and len(s) < self.zerolength:
-                raise base.UnsolvableException # Not all are padded
+                return False # Not all are padded
         
         try:
             numseries = [int(s) for s in self.series]
         except ValueError:
-            raise base.UnsolvableException
+            return False
         
-        self.numsolver = CombinedNumericSolver(numseries)
+        self.numsolver = CombinedNumericSolver.try_solve(numseries)
+        return self.numsolver is not None
     
     def generate(self, index):
         value = self.numsolver[index]
@@ -40,9 +44,14 @@ class ConstantZeroPaddingSolver(base.BaseSolver):
         
         if value is None:
             return None
+        elif isinstance(value, base.BigNumber):
+            return base.text(value) # Much longer than the padding anyway
         
         return format % value
     
+    def codegen(self, compiler):
+        return "_zeropad(%s, %d)" % (compiler.call(self.numsolver), self.zerolength)
+    
     def score(self):
         return self.numsolver.score()
     
@@ -54,6 +63,7 @@ class ZeroSeriesPrefixSolver(base.BaseSolver):
     '''An integer series with zeros at front. The number of the zeros is
     determined by a numeric solver.
     '''
+    __slots__ = ('zerosolver', 'numsolver', 'dozero')
     def analyze(self):
         numseries = []
         zerocounts = []
@@ -62,12 +72,17 @@ class ZeroSeriesPrefixSolver(base.BaseSolver):
             try:
                 numseries.append(int(s))
             except ValueError:
-                raise base.UnsolvableException
+                return False
             
             zerocounts.append(tools.getprefix(s, '0'))
         
-        self.zerosolver = CombinedNumericSolver(zerocounts)
-        self.numsolver = CombinedNumericSolver(numseries)
+        self.zerosolver = CombinedNumericSolver.try_solve(zerocounts)
+        if self.zerosolver is None:
+            return False
+        
+        self.numsolver = CombinedNumericSolver.try_solve(numseries)
+        if self.numsolver is None:
+            return False
         
         if [i for i in zerocounts if i != 0]:
             self.dozero = True
@@ -75,7 +90,10 @@ class ZeroSeriesPrefixSolver(base.BaseSolver):
             self.dozero = False
     
     def generate(self, index):
-        return '0' * self.zerosolver[index] + str(self.numsolver[index])
+        return '0' * base.length(self.zerosolver[index]) + base.text(self.numsolver[index])
+    
+    def codegen(self, compiler):
+        return "'0' * %s + str(%s)" % (compiler.call(self.zerosolver), compiler.call(self.numsolver))
     
     def score(self):
         if self.dozero:
@@ -97,9 +115,11 @@ class ZeroSeriesPrefixSolver(base.BaseSolver):
             return self.numsolver.name()
 
 class NumericOnlySolver(base.SelectSolver):
+    __slots__ = ()
     _solverclasses = [ConstantZeroPaddingSolver, ZeroSeriesPrefixSolver]
 
 class StringOnlySolver(base.SelectSolver):
+    __slots__ = ()
     _solverclasses = [basestring.BaseStringSolver, methodstringsolver.MethodStringSolver, recursivenumeric.FibonacciSolver]
 
 class SplitSolver(base.BaseSolver):
@@ -107,6 +127,8 @@ class SplitSolver(base.BaseSolver):
     Default compare method is str.isalpha:
     1A, 2B, 3C => 1,2,3 and A,B,C
     '''
+    __slots__ = ('startsolver', 'endsolver')
+    maxscore = 0.9
     
     def compare(self, a, b):
         return a.isalpha() != b.isalpha()
@@ -117,7 +139,7 @@ class SplitSolver(base.BaseSolver):
         splitpoints = []
         for s in self.series:
             if len(s) <= 1:
-                raise base.UnsolvableException
+                return False
             
             for i in range(1, len(s)):
                 a = s[i - 1]
@@ -126,17 +148,24 @@ class SplitSolver(base.BaseSolver):
                 if self.compare(a,b):
                     break
             else:
-                raise base.UnsolvableException # No change detected
+                return False # No change detected
             
             splitpoints.append(i)
             startseries.append(s[:i])
             endseries.append(s[i:])
         
-        self.startsolver = BaseCombinedSolver(startseries)
-        self.endsolver = BaseCombinedSolver(endseries)
+        self.startsolver = BaseCombinedSolver.try_solve(startseries)
+        if self.startsolver is None:
+            return False
+        
+        self.endsolver = BaseCombinedSolver.try_solve(endseries)
+        return self.endsolver is not None
     
     def generate(self, index):
         return self.startsolver[index] + self.endsolver[index]
+    
+    def codegen(self, compiler):
+        return "%s + %s" % (compiler.call(self.startsolver), compiler.call(self.endsolver))
 
     def score(self):
         return self.startsolver.score() * self.endsolver.score() * 0.9
@@ -147,19 +176,23 @@ class SplitSolver(base.BaseSolver):
 
 class DiffPositiveSplitSolver(SplitSolver):
     '''Detects change in difference'''
+    __slots__ = ()
     def compare(self, a, b):
         return alphabet.ord(b) - alphabet.ord(a) > 0
 
 class DiffNegativeSplitSolver(SplitSolver):
+    __slots__ = ()
     def compare(self, a, b):
         return alphabet.ord(b) - alphabet.ord(a) < 0
 
 class AlternatingTypeSolver(base.SelectSolver):
     '''For AlternatingNumberStringSolver'''
+    __slots__ = ()
     _solverclasses = [basenumeric.RecurringSolver, complexnumeric.RepeatSolver]
 
 class AlternatingNumberStringSolver(base.BaseSolver):
     '''Series with alternating numbers and strings.'''
+    __slots__ = ('numsolver', 'strsolver', 'typesolver')
     def analyze(self):
         typeseries = []
         numseries = []
@@ -173,10 +206,17 @@ class AlternatingNumberStringSolver(base.BaseSolver):
                 typeseries.append(1)
                 numseries.append(s)
         
-        self.numsolver = NumericOnlySolver(numseries)
-        self.strsolver = StringOnlySolver(strseries)
-        self.typesolver = AlternatingTypeSolver(typeseries)
-
+        self.numsolver = NumericOnlySolver.try_solve(numseries)
+        if self.numsolver is None:
+            return False
+        
+        self.strsolver = StringOnlySolver.try_solve(strseries)
+        if self.strsolver is None:
+            return False
+        
+        self.typesolver = AlternatingTypeSolver.try_solve(typeseries)
+        return self.typesolver is not None
+    
     def generate(self, index):
         if self.typesolver[index]:
             numindex = len([i for i in range(index) if self.typesolver[i]])
@@ -198,31 +238,44 @@ class AlternatingNumberStringSolver(base.BaseSolver):
 # by not trying more complex solvers if simple ones match well
 
 class BaseCombinedSolver(base.SelectSolver):
+    __slots__ = ()
     _solverclasses = [NumericOnlySolver, StringOnlySolver, AlternatingNumberStringSolver,
                       SplitSolver, DiffPositiveSplitSolver, DiffNegativeSplitSolver]
 
 class CombinedMergeSolver(complexnumeric.MergeSolver):
+    __slots__ = ()
     solverclass = BaseCombinedSolver
 
 class NonskipCombinedSolver(base.SelectSolver):
+    __slots__ = ()
     _solverclasses = [BaseCombinedSolver, CombinedMergeSolver]
 
 class SkipFirstSolver(base.BaseSolver):
     '''Try to solve difficult series by skipping some first values'''
+    __slots__ = ('skip', 'solver')
+    maxscore = 0.5
     def analyze(self):
+        # The searches for different skips share the solving cache. Most of them fail,
+        # and the failures of the selections are cached too, so the subseries common
+        # to several suffixes (eg. columns of characters or constant lengths) are
+        # searched only once.
         for self.skip in range(1, len(self.series) // 2):
+            if base._state.stepper is not None:
+                base._state.stepper.checkpoint()
+            
             series = self.series[self.skip:]
-            try:
-                self.solver = NonskipCombinedSolver(series)
-                break
-            except base.UnsolvableException:
-                continue
-        else:
-            raise base.UnsolvableException
+            self.solver = NonskipCombinedSolver.try_solve(series)
+            if self.solver is not None:
+                return True
+        
+        return False
     
     def generate(self, index):
         return self.solver[index - self.skip]
     
+    def codegen(self, compiler):
+        return compiler.call(self.solver, "i - %d" % self.skip)
+    
     def score(self):
         return self.solver.score() * (1.0/float(self.skip + 1))
     
@@ -239,12 +292,39 @@ class CombinedSolver(base.TresholdSelectSolver):
     
     2) Solver.generatelist(count) generates the next values after the given
     initial series.
+    
+    Solver.extend(newterms) returns a solver for the series with newterms
+    appended, reusing the parts of the solution that still match.
+    
+    With CombinedSolver(series, top_k = n), each selection keeps its n best
+    solutions. Solver.alternatives() then yields the n best solutions combined
+    from them, best first.
     '''
+    __slots__ = ()
 
     # Use SkipFirstSolver as a fallback
     _fastsolver = BaseCombinedSolver
     _slowsolver = SkipFirstSolver
     _treshold = 0.1
+    
+    def _select(self, series, fallback = True):
+        if cost.admission is not None and not base._state.admitted:
+            return cost.admit(self, series)
+        
+        if (not templates.active or not fallback or base._state.topk != 1 or
+                base._state.allowed is not None):
+            return base.TresholdSelectSolver._select(self, series, fallback)
+        
+        solver = templates.match(self.__class__, series)
+        if solver is not None:
+            self._solver = solver._solver
+            return True
+        
+        if not base.TresholdSelectSolver._select(self, series):
+            return False
+        
+        templates.learn(series, self)
+        return True
 
 if __name__ == '__main__':
     print("Unit testing")
@@ -261,5 +341,98 @@ if __name__ == '__main__':
     a = BaseCombinedSolver(['SIIKA', 'SIIIKA', 'SIIIIKA'])
     assert a.generatelist(2) == ['SIIIIIKA', 'SIIIIIIKA']
     
+    a = CombinedSolver(['A50X', 'B100XX', 'C200XXX'])
+    assert isinstance(a._solver, SplitSolver)
+    assert not isinstance(a._solver.startsolver, base.WrapperSolver) # Selection wrappers are collapsed
+    assert a.name() == 'SplitSolver'
+    assert not hasattr(a._solver, '__dict__') # Only __slots__ are used
+    
+    c = SkipFirstSolver.__new__(SkipFirstSolver)
+    c.series, c.skip, c.solver = ['X', 'A1', 'B2', 'C3'], 1, CombinedSolver(['A1', 'B2', 'C3'])
+    d = base.collapse(c)
+    assert d.solver is base.unwrap(c.solver)
+    assert isinstance(c.solver, CombinedSolver) # Copied, as the solvers can be shared
+    assert base.collapse(d) is d
+    
+    b = a.extend(['D400XXXX']) # Already predicted, nothing is searched
+    assert b._solver.startsolver is a._solver.startsolver
+    assert b.generatelist(1) == ['E800XXXXX']
+    
+    b = CombinedSolver(['A1', 'B2', 'C3']).extend(['D5', 'E8'])
+    assert b.generatelist(2) == CombinedSolver(['A1', 'B2', 'C3', 'D5', 'E8']).generatelist(2)
+    assert a.generatelist(2) == ['D400XXXX', 'E800XXXXX'] # Original is not modified
+    
+    # Solvers with a low score are searched again even if they predict the new terms
+    for series, newterms in ((['D', 'C', 'C'], ['B']), (['AC', 'AC', 'DA'], ['CC']),
+                             (['CBA', 'ABB', 'BAC', 'ACA', 'BBA'], ['ABB']), (['A1', 'B2'], ['C3'])):
+        extended = CombinedSolver(series).extend(newterms)
+        fresh = CombinedSolver(series + newterms)
+        assert extended.generatelist(3) == fresh.generatelist(3)
+        assert extended.score() == fresh.score()
+    
+    a = CombinedSolver(['A1', 'B2', 'C3'], top_k = 3)
+    alternatives = list(a.alternatives())
+    assert alternatives[0].generatelist(2) == a.generatelist(2) == ['D4', 'E5']
+    assert ['D5', 'E8'] in [s.generatelist(2) for s in alternatives]
+    assert alternatives[0].score() >= alternatives[1].score()
+    
+    a = CombinedSolver(['A50X', 'B100XX', 'C200XXX'], top_k = 3)
+    assert len(list(a.alternatives())) == 3 # Not all the combinations
+    assert len(list(a.alternatives(5))) == 5
+    
+    # The classes that can't get among the top_k are skipped without changing the alternatives
+    for series in (['1', '2', '4'], ['1', '2'], ['AB', 'BC'], ['A1', 'B2', 'C3']):
+        base.clearcache()
+        pruned = [s.generatelist(2) for s in CombinedSolver(series, top_k = 4).alternatives()]
+        maxscore, base.maxscore = base.maxscore, lambda cls: 1.0 # Nothing is skipped
+        try:
+            base.clearcache()
+            assert pruned == [s.generatelist(2) for s in CombinedSolver(series, top_k = 4).alternatives()]
+        finally:
+            base.maxscore = maxscore
+    
+    # Formulas of huge numbers are in brackets inside strings
+    assert CombinedSolver(['1A', '2B', '4C', '8D']).generatelist(28, maxdigits = 9)[-1] == '[2^31]5'
+    a = CombinedSolver(['A1', 'B2', 'C4', 'D8'])
+    assert a.generatelist(28, maxdigits = 9)[-1] == '5[2^31]'
+    assert a.generatelist(28)[-1] == '5' + str(2 ** 31) # Cached apart from the formulas
+    assert a.generatelist(28, maxdigits = 9)[-1] == '5[2^31]'
+    
+    # Stepped searches run in turns, like in an event loop
+    import threading
+    base.clearcache()
+    searches = {'1AB': CombinedSolver.steps(['1AB', '2BC', '3CD', '4DE'], units = 1),
+                'ABC': CombinedSolver.steps(['ABC', 'ACE', 'ADG'], units = 1),
+                'XY': CombinedSolver.steps(['XY', 'YX'] * 2, units = 1)}
+    results = {}
+    steps = 0
+    while searches:
+        for key, search in list(searches.items()):
+            try:
+                next(search)
+                steps += 1
+            except StopIteration as e:
+                results[key] = e.value.generatelist(1)
+                del searches[key]
+            except base.UnsolvableException:
+                results[key] = None
+                del searches[key]
+    
+    assert steps > 10
+    assert results['1AB'] == ['5EF'] and results['ABC'] == ['AEI'] and results['XY'] == ['XY']
+    assert threading.active_count() == 1 # The finished search threads were joined
+    
+    base.clearcache()
+    search = CombinedSolver.steps(['1AB', '2BC', '3CD', '4DE'], units = 1)
+    next(search)
+    search.close() # The search thread stops without caching partial results
+    assert threading.active_count() == 1
+    
+    search = CombinedSolver.steps(['1AB', '2BC', '3CD', '4DE'], units = 1)
+    next(search)
+    del search # Closed by the garbage collection
+    assert threading.active_count() == 1
+    assert CombinedSolver(['1AB', '2BC', '3CD', '4DE']).generatelist(1) == ['5EF']
+    
     print("OK")
 
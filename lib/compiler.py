@@ -0,0 +1,187 @@
+'''Compile an already solved solver tree to a flat Python function.
+
+Each solver can describe its generate() as a Python expression of the
+index variable i, with its parameters inlined as constants. The compiler
+stitches these expressions together, so that generating a value does not
+have to go through the wrapper, caching and type checking layers of the
+original tree:
+
+import lib
+from lib import compiler
+
+s = lib.Solver(['A50', 'B100', 'C200'])
+c = compiler.compile(s)
+print c.source
+
+=> def _solver(i):
+       return ((_c0[(10 + 1 * i) % 36]) + ('0' * (0) + str((50 * 2 ** i if i >= 0 else _c1(i)))))
+
+Solvers that cannot express themselves as an expression are called
+through their normal __getitem__, so the result is always the same as
+with the original solver.
+'''
+
+import ast
+
+from . import base
+
+class _Substitute(ast.NodeTransformer):
+    '''Replace the index variable of an expression with another expression.'''
+    def __init__(self, index):
+        self.index = index
+    
+    def visit_Name(self, node):
+        if node.id == 'i':
+            return self.index
+        return node
+
+def _zeropad(value, width):
+    '''Same as ConstantZeroPaddingSolver.generate()'''
+    if value is None:
+        return None
+    
+    return "%0*d" % (width, value)
+
+class Compiler:
+    '''Collects the constants and helper functions of a compiled solver.'''
+    def __init__(self):
+        self.namespace = {'_zeropad': _zeropad}
+        self.definitions = []
+        self.constants = {}
+        self.expressions = {}
+        self.variables = 0
+    
+    def constant(self, value):
+        '''Return the name of a global holding value in the compiled code.'''
+        if id(value) not in self.constants:
+            name = '_c%d' % len(self.constants)
+            self.constants[id(value)] = (name, value) # Keep value alive, id() must stay unique
+            self.namespace[name] = value
+        
+        return self.constants[id(value)][0]
+    
+    def variable(self):
+        '''Return an unique name for a variable in a list comprehension.'''
+        self.variables += 1
+        return '_v%d' % self.variables
+    
+    def function(self, expression, name = None):
+        '''Define a helper function returning expression and return its name.'''
+        if not name:
+            name = '_f%d' % len(self.definitions)
+        
+        source = "def %s(i):\n    return %s\n" % (name, expression)
+        exec(source, self.namespace)
+        self.definitions.append(source)
+        return name
+    
+    def expression(self, solver):
+        '''Python expression for solver[i], including the handling of the
+        initial series and negative indexes done by GeneratingSolver.__getitem__.
+        '''
+        # Selection and alteration wrappers pass item access directly to the real solver
+        while isinstance(solver, base.WrapperSolver):
+            solver = solver._solver
+        
+        if id(solver) in self.expressions:
+            return self.expressions[id(solver)]
+        
+        expression = solver.codegen(self)
+        
+        if expression is None:
+            expression = "%s[i]" % self.constant(solver)
+        else:
+            expression = "(%s)" % expression
+            series = getattr(solver, 'series', None)
+            if series and not self.reproduces(expression, series):
+                expression = "(%s[i] if 0 <= i < %d else %s)" % (
+                             self.constant(series), len(series), expression)
+            
+            if not solver.can_do_negative:
+                expression = "(%s if i >= 0 else %s[i])" % (expression, self.constant(solver))
+        
+        self.expressions[id(solver)] = expression
+        return expression
+    
+    def reproduces(self, expression, series):
+        '''Check if the expression alone gives the initial series.'''
+        function = eval("lambda i: " + expression, self.namespace)
+        
+        try:
+            for i in range(len(series)):
+                if function(i) != series[i]:
+                    return False
+        except Exception:
+            return False
+        
+        return True
+    
+    def call(self, solver, index = 'i'):
+        '''Python expression for solver[index]. Short expressions are inlined,
+        others are made to helper functions.'''
+        expression = self.expression(solver)
+        
+        if index == 'i':
+            return expression
+        
+        tree = ast.parse(expression, mode = 'eval')
+        uses = len([n for n in ast.walk(tree) if isinstance(n, ast.Name) and n.id == 'i'])
+        indextree = ast.parse(index, mode = 'eval').body
+        
+        if uses > 1 and not isinstance(indextree, (ast.Name, ast.Constant)):
+            return "%s(%s)" % (self.function(expression), index)
+        
+        tree = _Substitute(indextree).visit(tree)
+        return "(%s)" % ast.unparse(tree)
+
+class CompiledSolver:
+    '''Generates the same values as the original solver, using a compiled function.'''
+    def __init__(self, function, solver, source):
+        self.function = function
+        self.solver = solver
+        self.series = solver.series
+        self.source = source
+    
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            values = [self.function(i) for i in range(key.start or 0, key.stop, key.step or 1)]
+            return [v for v in values if v is not None]
+        
+        if not isinstance(key, int):
+            raise IndexError
+        
+        return self.function(key)
+    
+    def generatelist(self, count, maxdigits = None):
+        '''Same as Solver.generatelist(). The compiled code doesn't check the digit
+        budget, so with maxdigits the values are generated by the original solver.'''
+        if maxdigits is not None:
+            return self.solver.generatelist(count, maxdigits)
+        
+        start = len(self.series)
+        return self[start : start + count]
+
+def compile(solver):
+    '''Compile a solver to a CompiledSolver.'''
+    c = Compiler()
+    name = c.function(c.call(solver), '_solver')
+    return CompiledSolver(c.namespace[name], solver, ''.join(c.definitions))
+
+if __name__ == '__main__':
+    print("Unit testing")
+    
+    from .combinedsolver import CombinedSolver
+    
+    for series in (['A50X', 'B100XX', 'C200XXX', 'D400XXXX'], ['1', '2', '6', '24'],
+                   ['A', 'ABA', 'ABCBA'], ['1', '1', '2', '3', '5'], ['001', '002', '003'],
+                   ['1', '1', '2', '2', '4', '3', '8', '4']):
+        a = CombinedSolver(series)
+        c = compile(a)
+        assert c[:30] == a[:30]
+        assert c.generatelist(5) == a.generatelist(5)
+        assert c.generatelist(5, maxdigits = 1000) == a.generatelist(5)
+    
+    c = compile(CombinedSolver(['1A', '2B', '4C', '8D']))
+    assert c.generatelist(28, maxdigits = 9)[-1] == '[2^31]5'
+    
+    print("OK")
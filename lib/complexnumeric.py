@@ -1,3 +1,5 @@
+import threading
+
 from . import tools
 from . import base
 from . import basenumeric
@@ -6,6 +8,8 @@ class SumSolver(base.BaseSolver):
     '''Sum of another solver up to the index.
     1,2,3,4 and start=1 => 1,2,4,7,11
     '''
+    __slots__ = ('numsolver',)
+    maxscore = 0.4
     minimum_entries = 4
     
     def analyze(self):
@@ -14,7 +18,8 @@ class SumSolver(base.BaseSolver):
         for a,b in tools.tupleslices(self.series, 2):
             numseries.append(b - a)
         
-        self.numsolver = basenumeric.BaseNumericSolver(numseries)
+        self.numsolver = basenumeric.BaseNumericSolver.try_solve(numseries)
+        return self.numsolver is not None
     
     def generate(self, index):
         if index > 0:
@@ -33,36 +38,78 @@ class MergeSolver(base.BaseSolver):
     '''Interleave two or three other series.
     1,2,3,4 + 1,2,4,8 => 1,1,2,2,3,4,4,8
     '''
+    __slots__ = ('solvers', 'mergecount')
+    maxscore = 0.8
     
     solverclass = basenumeric.BaseNumericSolver # This class is used also for CombinedMergeSolver
     minimum_entries = 4
     can_do_negative = True
+    maxmergecount = 8 # More interleaved series are hardly a pattern anyone would see
     
-    def _analyze(self, mergecount):
-        series = [list() for i in range(mergecount)]
-        
-        for i in range(len(self.series)):
-            mod = i % mergecount
-            series[mod].append(self.series[i])
+    def _analyze(self, mergecount, bestscore):
+        '''Solve the series interleaved with stride mergecount. Returns the score and
+        the solvers, or None if they can't be solved or can't beat bestscore.
+        '''
+        solvers = []
+        score = 0.8
+        bound = base.maxscore(self.solverclass)
+        for mod in range(mergecount):
+            if bestscore is not None and score * bound ** (mergecount - mod) <= bestscore:
+                return None # Even the best scores for the rest can't win
+            
+            solver = self.solverclass.try_solve(self.series[mod::mergecount])
+            if solver is None:
+                return None
+            
+            score *= solver.score()
+            solvers.append(solver)
         
-        self.solvers = []
-        for s in series:
-            solver = self.solverclass(s)
-            self.solvers.append(solver)
+        if bestscore is not None and score <= bestscore:
+            return None
         
-        self.mergecount = mergecount
+        return score, solvers
     
     def analyze(self):
-        try:
-            self._analyze(2)
-        except base.UnsolvableException:
-            self._analyze(3)
+        # Each stride up to a third of the length is tried, so that every interleaved
+        # series has at least 3 entries. Stride 3 is also tried on shorter series if
+        # stride 2 fails. With 2 entries per series almost anything solves, so there
+        # it would only add false matches. The best score wins, ties are won by the
+        # smaller stride. Multiples of a solved stride are tried too, as splitting
+        # further can score better, eg. 1,2,1,3,1,2,1,3 with stride 4. The best score
+        # so far bounds them, see _analyze().
+        #
+        # Strides over maxmergecount are rejected without solving anything. On long
+        # series they were most of the work, as there are n/3 of them and each one
+        # solves at least its first interleaved series before failing.
+        self.solvers = None
+        bestscore = None
+        
+        for mergecount in range(2, min(max(3, len(self.series) // 3), self.maxmergecount) + 1):
+            if bestscore is not None and mergecount > len(self.series) // 3:
+                break
+            
+            result = self._analyze(mergecount, bestscore)
+            if result is None:
+                continue
+            
+            bestscore, self.solvers = result
+            self.mergecount = mergecount
+        
+        return self.solvers is not None
     
     def generate(self, index):
         mod = index % self.mergecount
         idx = index // self.mergecount
         return self.solvers[mod][idx]
     
+    def codegen(self, compiler):
+        index = "i // %d" % self.mergecount
+        result = compiler.call(self.solvers[-1], index)
+        for mod in reversed(range(len(self.solvers) - 1)):
+            result = "%s if i %% %d == %d else %s" % (compiler.call(self.solvers[mod], index),
+                                                      self.mergecount, mod, result)
+        return result
+    
     def score(self):
         score = 0.8
         for solver in self.solvers:
@@ -78,10 +125,14 @@ class MergeSolver(base.BaseSolver):
         
         return result
 
+_repeatlock = threading.RLock() # Nested RepeatSolvers lock it again
+
 class RepeatSolver(base.BaseSolver):
     '''Non-sequence version of ListRepeatSolver.
     [1], [2,2], [3,3,3] => 1,2,2,3,3,3
     '''
+    __slots__ = ('solver', 'assumption', '_generated', '_genindex')
+    maxscore = 0.8
     minimum_entries = 3
     can_do_negative = False
     
@@ -100,31 +151,33 @@ class RepeatSolver(base.BaseSolver):
         current.append(b)
         self.assumption = False
         
-        self.generated = []
-        self.genindex = 0
-        
-        try:
-            self.solver = RepeatListSolver(lists)
-            
-            if self.solver[len(lists)][:len(current)] != current: # Check the part that was left over
-                raise base.UnsolvableException
+        self.solver = RepeatListSolver.try_solve(lists)
         
-        except base.UnsolvableException:
+        if self.solver is None or self.solver[len(lists)][:len(current)] != current: # Check the part that was left over
             lists.append(current) # Assume that it ends at a list boundary
             self.assumption = True # For score calculation
-            self.solver = RepeatListSolver(lists)
+            self.solver = RepeatListSolver.try_solve(lists)
+        
+        return self.solver is not None
     
     def generate(self, index):
-        tries = 0
-        while len(self.generated) <= index:
-            self.generated += self.solver[self.genindex]
-            self.genindex += 1
+        with base.locked(_repeatlock): # Two threads extending the list would add the same lists twice
+            try:
+                generated = self._generated
+            except AttributeError: # Like the cache, created when first needed
+                generated = self._generated = []
+                self._genindex = 0
             
-            tries += 1
-            if tries > 10: # RepeatSolver is no longer generating anything.. eg. 11111 2222 333 44 5
-                return None
-        
-        return self.generated[index]
+            tries = 0
+            while len(generated) <= index:
+                generated += self.solver[self._genindex]
+                self._genindex += 1
+                
+                tries += 1
+                if tries > 10: # RepeatSolver is no longer generating anything.. eg. 11111 2222 333 44 5
+                    return None
+            
+            return generated[index]
 
     def score(self):
         if self.assumption:
@@ -139,9 +192,11 @@ from . import recursivenumeric
 from . import primes
 
 class CombinedNumericSolver(base.SelectSolver):
+    __slots__ = ()
     _solverclasses = [basenumeric.BaseNumericSolver, SumSolver, MergeSolver, RepeatSolver,
                       recursivenumeric.FibonacciSolver, recursivenumeric.RecursiveExponentSolver,
-                      recursivenumeric.FactorialSolver, primes.PrimeSolver]
+                      recursivenumeric.FactorialSolver, primes.PrimeSolver,
+                      basenumeric.PolynomialSolver, recursivenumeric.LinearRecurrenceSolver]
 
 if __name__ == '__main__':
     print("Unit testing")
@@ -149,7 +204,20 @@ if __name__ == '__main__':
     a = MergeSolver([1,1,2,2,4,3,8,4])
     assert a.generatelist(2) == [16,5]
     
+    channels = [[1,2,3,4], [10,20,30,40], [5,5,5,5], [2,4,8,16]]
+    a = MergeSolver([c[i] for i in range(4) for c in channels])
+    assert a.mergecount == 4
+    assert a.generatelist(4) == [5,50,5,32]
+    
+    a = MergeSolver([1,2,1,3] * 4) # Stride 2 solves too, with a lower score
+    assert a.mergecount == 4
+    
     a = RepeatSolver([1,2,2,3,3,3])
     assert a.generatelist(5) == [4,4,4,4,5]
     
+    s = [1,2,3]
+    CombinedNumericSolver(s)
+    s += [5,8] # The same list, solved again with the new entries
+    assert CombinedNumericSolver(s).generatelist(2) == [13,21]
+    
     print("OK")
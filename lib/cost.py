@@ -0,0 +1,277 @@
+'''Estimate the cost of solving a series before solving it, and control which
+searches are admitted when the server is busy:
+
+from lib import cost
+
+print cost.estimate(['A1', 'B2', 'C3'])
+
+=> {'seconds': 0.0016, 'fastseconds': 0.0016, 'fallback': False}
+
+seconds      Predicted time of lib.Solver(series).
+fastseconds  Same, without the SkipFirstSolver fallback.
+fallback     True if the fallback is likely needed, ie. the first entry doesn't
+             follow the pattern of the others.
+
+The estimate only looks at the shape of the series: the number and length of
+the entries, whether they are numbers, letters or mixed, and whether their
+length is constant. It is within a factor of 3 or so for most series, which is
+enough to tell the searches of a millisecond from those of a second.
+calibrate() fits the time scale to the current machine.
+
+An admission policy is consulted by lib.Solver before each search:
+
+cost.admission = cost.LoadPolicy()
+
+Its admit(series, estimate) returns ACCEPT, DOWNGRADE to search without the
+fallback, or REJECT to raise OverloadedException. It can queue the search by
+waiting before returning. done(series, estimate, decision) is called when an
+admitted search ends.
+'''
+
+import os
+import time
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None # Eg. on Windows LoadPolicy only looks at the load average
+
+from . import base
+from . import stats
+
+ACCEPT = 'accept'
+DOWNGRADE = 'downgrade'
+REJECT = 'reject'
+
+admission = None # Policy consulted by lib.Solver, see LoadPolicy
+
+_scale = 3.3e-5 # Seconds per unit of work(), fitted to the test cases
+
+class OverloadedException(Exception):
+    '''The admission policy rejected the search'''
+
+def work(series):
+    '''Relative cost of searching series, without the fallback. The splits into
+    columns and parts grow with the total length times the longest entry.'''
+    lengths = [len(str(s)) for s in series]
+    units = sum(lengths) * max(lengths)
+    
+    if len(set(lengths)) == 1 and lengths[0] > 1:
+        units *= 2 # Every column is tried separately
+    
+    if set(stats.kindof(s) for s in series) != set(['alpha']):
+        units *= 2 # Numeric and mixed solvers are tried too
+    
+    return units
+
+def _linear(values):
+    return len(set(b - a for a, b in zip(values, values[1:]))) <= 1
+
+def _breaks(series):
+    '''Check if the first entry doesn't follow the pattern of the others.'''
+    first, rest = series[0], series[1:]
+    
+    kinds = set(stats.kindof(s) for s in rest)
+    if len(kinds) == 1 and stats.kindof(first) not in kinds:
+        return True
+    
+    lengths = [len(str(s)) for s in series]
+    if _linear(lengths[1:]) and not _linear(lengths):
+        return True
+    
+    numbers = [stats.numberof(s) for s in series]
+    return kinds == set(['num']) and _linear(numbers[1:]) and not _linear(numbers)
+
+def estimate(series):
+    '''Return the predicted cost of solving series, see the module documentation.'''
+    fastseconds = _scale * work(series)
+    
+    # SkipFirstSolver searches the suffixes until one of them is solved
+    fallback = len(series) >= 4 and _breaks(series)
+    seconds = fastseconds
+    if fallback:
+        seconds += _scale * sum(work(series[skip:]) for skip in range(1, len(series) // 2))
+    
+    return {'seconds': seconds, 'fastseconds': fastseconds, 'fallback': fallback}
+
+def calibrate(allseries):
+    '''Fit the time scale of the estimates to the solving time of allseries on
+    this machine. Returns the ratio of the new scale to the old one. The series
+    are solved with an empty solving cache, and the entries of the cache are
+    put back afterwards.'''
+    global _scale
+    from .combinedsolver import CombinedSolver
+    
+    cache = base.SelectSolver._solvingcache
+    saved = dict(cache)
+    ratios = []
+    try:
+        for series in allseries:
+            cache.clear()
+            start = time.perf_counter()
+            try:
+                CombinedSolver(series)
+            except base.UnsolvableException:
+                pass
+            
+            ratios.append((time.perf_counter() - start) / estimate(series)['seconds'])
+    finally:
+        cache.clear()
+        cache.update(saved)
+    
+    ratios.sort()
+    ratio = ratios[len(ratios) // 2]
+    _scale *= ratio
+    return ratio
+
+def admit(selection, series):
+    '''Solve series with selection as admission decides. Called by the outermost
+    selection of lib.Solver.'''
+    expected = estimate(series)
+    decision = admission.admit(series, expected)
+    if decision == REJECT:
+        raise OverloadedException
+    
+    base._state.admitted = True
+    try:
+        return selection._select(series, decision != DOWNGRADE)
+    finally:
+        base._state.admitted = False
+        admission.done(series, expected, decision)
+
+class LoadPolicy:
+    '''Accept the cheap searches. The expensive ones wait for one of slots, for
+    at most timeout seconds, and when the load average of the machine is over
+    maxload they are not queued. A search that doesn't get a slot is done without
+    the fallback if that is cheap, otherwise rejected.
+    
+    The slots are lock files in lockdir, so they are shared by all the processes
+    using the same directory, eg. the requests of a CGI script.'''
+    def __init__(self, maxseconds = 0.05, slots = None, maxload = None, timeout = 1.0,
+                 lockdir = None):
+        self.maxseconds = maxseconds
+        self.slots = slots or os.cpu_count()
+        self.maxload = maxload if maxload is not None else os.cpu_count()
+        self.timeout = timeout
+        self.lockdir = lockdir or tempfile.gettempdir()
+        self.held = threading.local() # The slot file locked by the thread
+    
+    def load(self):
+        try:
+            return os.getloadavg()[0]
+        except (AttributeError, OSError): # Not available eg. on Windows
+            return 0.
+    
+    def acquire(self):
+        '''Lock one of the slot files, waiting at most timeout seconds.'''
+        if fcntl is None:
+            return True
+        
+        deadline = time.monotonic() + self.timeout
+        while True:
+            for slot in range(self.slots):
+                f = open(os.path.join(self.lockdir, 'zizzo-slot-%d.lock' % slot), 'a')
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError: # Locked by another search
+                    f.close()
+                    continue
+                
+                self.held.file = f
+                return True
+            
+            if time.monotonic() >= deadline:
+                return False
+            
+            time.sleep(0.01)
+    
+    def release(self):
+        f = getattr(self.held, 'file', None)
+        if f is not None:
+            self.held.file = None
+            fcntl.flock(f, fcntl.LOCK_UN)
+            f.close()
+    
+    def admit(self, series, estimate):
+        if estimate['seconds'] < self.maxseconds:
+            return ACCEPT
+        
+        if self.load() <= self.maxload and self.acquire():
+            return ACCEPT
+        
+        if estimate['fastseconds'] < self.maxseconds:
+            return DOWNGRADE
+        
+        return REJECT
+    
+    def done(self, series, estimate, decision):
+        self.release()
+
+if __name__ == '__main__':
+    print("Unit testing")
+    
+    from . import cost # The module used by the solvers, not __main__
+    from .combinedsolver import CombinedSolver
+    
+    assert estimate(['A', 'B', 'C'])['seconds'] < estimate(['AAAAAABC', 'AAAAABCC', 'AAAABCCC'])['seconds']
+    assert estimate(['A1', 'B2', 'C3'])['seconds'] > estimate(['AB', 'BC', 'CD'])['seconds']
+    assert not estimate(['1', '2', '3', '4'])['fallback']
+    
+    a = estimate(['5', 'A1', 'B2', 'C3', 'D4'])
+    assert a['fallback'] and a['seconds'] > a['fastseconds']
+    assert estimate(['7', '1', '2', '3', '4'])['fallback']
+    
+    class Always:
+        def __init__(self, decision):
+            self.decision = decision
+            self.admitted = []
+        
+        def admit(self, series, estimate):
+            self.admitted.append(series)
+            return self.decision
+        
+        def done(self, series, estimate, decision):
+            pass
+    
+    base.clearcache()
+    cost.admission = Always(DOWNGRADE)
+    try:
+        CombinedSolver(['5', 'A1', 'B2', 'C3', 'D4'])
+        assert False # Needs the fallback
+    except base.UnsolvableException:
+        pass
+    
+    cost.admission = Always(ACCEPT)
+    assert CombinedSolver(['5', 'A1', 'B2', 'C3', 'D4']).generatelist(1) == ['E5']
+    assert cost.admission.admitted == [['5', 'A1', 'B2', 'C3', 'D4']] # Only the outermost search
+    
+    cost.admission = Always(REJECT)
+    try:
+        CombinedSolver(['A', 'B', 'C'])
+        assert False
+    except cost.OverloadedException:
+        pass
+    
+    # Two policies with the same lock directory, as in two processes
+    lockdir = tempfile.mkdtemp()
+    policy = LoadPolicy(maxseconds = 0.001, slots = 1, maxload = float('inf'), timeout = 0,
+                        lockdir = lockdir)
+    other = LoadPolicy(maxseconds = 0.001, slots = 1, maxload = float('inf'), timeout = 0,
+                       lockdir = lockdir)
+    expensive = estimate(['AAAAAABC', 'AAAAABCC', 'AAAABCCC'])
+    assert policy.admit(['A', 'B', 'C'], estimate(['A', 'B', 'C'])) == ACCEPT
+    assert policy.admit([], expensive) == ACCEPT # Gets the only slot
+    assert other.admit([], expensive) == REJECT or fcntl is None
+    policy.done([], expensive, ACCEPT)
+    assert other.admit([], expensive) == ACCEPT
+    other.done([], expensive, ACCEPT)
+    
+    cost.admission = None
+    CombinedSolver(['A', 'B', 'C'])
+    before = len(base.SelectSolver._solvingcache)
+    calibrate([['A', 'B', 'C'], ['1', '2', '4']])
+    assert len(base.SelectSolver._solvingcache) == before # Put back
+    
+    print("OK")
@@ -6,6 +6,7 @@ class IndexOffsetSolver(base.AlterSolver):
     '''Used mostly for backwards-generation. If __init__ is called with offset = 2, and
     value at index 4 is to be generated, the real solver is passed index 4 + 2 = 6
     '''
+    __slots__ = ('offset',)
     def __init__(self, solver, offset):
         base.AlterSolver.__init__(self, solver)
         
@@ -16,6 +17,7 @@ class IndexOffsetSolver(base.AlterSolver):
 
 class NonNegativeOnlySolver(base.AlterSolver):
     '''Never return negative results. Only valid for numeric solvers.'''
+    __slots__ = ()
     def __init__(self, solver):
         base.AlterSolver.__init__(self, solver)
     
@@ -23,6 +25,7 @@ class NonNegativeOnlySolver(base.AlterSolver):
         return max(self._solver[index], 0)
 
 class DummyAritmeticSolver(base.GeneratingSolver):
+    __slots__ = ('first', 'difference')
     def __init__(self, first, difference):
         base.GeneratingSolver.__init__(self)
         
@@ -24,9 +24,9 @@ class KnownSeriesSolver(base.BaseSolver):
                     self.result = series
                     self.offset = start
                     self.score = score
-                    return
+                    return True
         
-        raise base.UnsolvableException
+        return False
     
     def generate(self, index):
         return self.result[index + self.offset]
@@ -13,6 +13,8 @@ class AritmeticListSolver(base.BaseSolver):
     '''Each list is generated by an aritmetic solver. It's start, difference and length are
     generated by other numeric solvers.
     '''
+    __slots__ = ('startsolver', 'diffsolver', 'lengthsolver')
+    maxscore = 0.8
     can_do_negative = True
     minimum_entries = 2
     def analyze(self):
@@ -20,20 +22,38 @@ class AritmeticListSolver(base.BaseSolver):
         diffseries = []
         lengthseries = []
         for s in self.series:
-            params = basenumeric.AritmeticSolver(s).params()
+            solver = basenumeric.AritmeticSolver.try_solve(s)
+            if solver is None:
+                return False
+            
+            params = solver.params()
             startseries.append(params['first'])
             diffseries.append(params['difference'])
             lengthseries.append(len(s))
         
-        self.startsolver = complexnumeric.CombinedNumericSolver(startseries)
-        self.diffsolver = complexnumeric.CombinedNumericSolver(diffseries)
+        self.startsolver = complexnumeric.CombinedNumericSolver.try_solve(startseries)
+        if self.startsolver is None:
+            return False
+        
+        self.diffsolver = complexnumeric.CombinedNumericSolver.try_solve(diffseries)
+        if self.diffsolver is None:
+            return False
+        
+        lengthsolver = complexnumeric.CombinedNumericSolver.try_solve(lengthseries)
+        if lengthsolver is None:
+            return False
         
-        lengthsolver = complexnumeric.CombinedNumericSolver(lengthseries)
         self.lengthsolver = dummysolvers.NonNegativeOnlySolver(lengthsolver)
     
     def generate(self, index):
         s = dummysolvers.DummyAritmeticSolver(self.startsolver[index], self.diffsolver[index])
-        return s[0 : self.lengthsolver[index]]
+        return s[0 : base.length(self.lengthsolver[index])]
+    
+    def codegen(self, compiler):
+        first, difference, i = compiler.variable(), compiler.variable(), compiler.variable()
+        return "[%s + %s * %s for %s in [%s] for %s in [%s] for %s in range(%s)]" % (
+               first, difference, i, first, compiler.call(self.startsolver),
+               difference, compiler.call(self.diffsolver), i, compiler.call(self.lengthsolver))
     
     def params(self):
         return {'startsolver': self.startsolver,
@@ -47,24 +67,35 @@ class VaryLengthListSolver(base.BaseSolver):
     '''Same solver, but generate different amount of entries:
     [1] [1,2] [1,2,3] => [1,2,3,...] with length [1,2,3]
     '''
+    __slots__ = ('numsolver', 'lengthsolver')
+    maxscore = 0.9
     can_do_negative = True
     
     def analyze(self):
         testseries = self.series[:]
         testseries.sort(key = lambda x: len(x)) # Use the longest entry
         
-        self.numsolver = complexnumeric.CombinedNumericSolver(testseries[-1])
+        self.numsolver = complexnumeric.CombinedNumericSolver.try_solve(testseries[-1])
+        if self.numsolver is None:
+            return False
         
         lengthseries = [len(s) for s in self.series]
-        lengthsolver = complexnumeric.CombinedNumericSolver(lengthseries)
+        lengthsolver = complexnumeric.CombinedNumericSolver.try_solve(lengthseries)
+        if lengthsolver is None:
+            return False
+        
         self.lengthsolver = dummysolvers.NonNegativeOnlySolver(lengthsolver)
-    
-        self.validate(start = 0)
+        return self.matches(start = 0)
     
     def generate(self, index):
-        length = self.lengthsolver[index]
+        length = base.length(self.lengthsolver[index])
         return self.numsolver[:length]
     
+    def codegen(self, compiler):
+        value, i = compiler.variable(), compiler.variable()
+        return "[%s for %s in range(%s) for %s in [%s] if %s is not None]" % (
+               value, i, compiler.call(self.lengthsolver), value, compiler.call(self.numsolver, i), value)
+    
     def params(self):
         return {'numsolver': self.numsolver,
                 'lengthsolver': self.lengthsolver}
@@ -75,21 +106,26 @@ class VaryLengthListSolver(base.BaseSolver):
 class ReverseVaryLengthListSolver(VaryLengthListSolver):
     '''Same as VaryLengthListSolver, but the list expands from beginning.
     '''
+    __slots__ = ('realseries',)
+    maxscore = 0.9 * 0.9
     can_do_negative = True
     
-    def __init__(self, series):
-        self.realseries = series
-        series = [s[::-1] for s in series]
-        VaryLengthListSolver.__init__(self, series)
+    def analyze(self):
+        self.realseries = self.series
+        self.series = [s[::-1] for s in self.series]
+        return VaryLengthListSolver.analyze(self)
     
     def generate(self, index):
-        length = self.lengthsolver[index]
+        length = base.length(self.lengthsolver[index])
         series = self.numsolver[:length]
         return series[::-1]
     
-    def validate(self, *args, **kwargs):
+    def codegen(self, compiler):
+        return VaryLengthListSolver.codegen(self, compiler) + "[::-1]"
+    
+    def matches(self, *args, **kwargs):
         kwargs['series'] = self.realseries
-        VaryLengthListSolver.validate(self, *args, **kwargs)
+        return VaryLengthListSolver.matches(self, *args, **kwargs)
     
     def score(self):
         return 0.9 * VaryLengthListSolver.score(self)
@@ -102,6 +138,8 @@ class RepeatListSolver(base.BaseSolver):
     
     1,2,3 repeated by 1,2,3 => [1], [2,2], [3,3,3]
     '''
+    __slots__ = ('valuesolver', 'lengthsolver')
+    maxscore = 0.8
     can_do_negative = True
     
     def analyze(self):
@@ -110,23 +148,32 @@ class RepeatListSolver(base.BaseSolver):
         
         for lst in self.series:
             if not isinstance(lst, list):
-                raise base.UnsolvableException
+                return False
             
             for entry in lst:
                 if entry != lst[0]:
-                    raise base.UnsolvableException
+                    return False
             
             values.append(lst[0])
             lengths.append(len(lst))
         
-        self.valuesolver = basenumeric.BaseNumericSolver(values)
-        lengthsolver = basenumeric.BaseNumericSolver(lengths)
+        self.valuesolver = basenumeric.BaseNumericSolver.try_solve(values)
+        if self.valuesolver is None:
+            return False
+        
+        lengthsolver = basenumeric.BaseNumericSolver.try_solve(lengths)
+        if lengthsolver is None:
+            return False
+        
         self.lengthsolver = dummysolvers.NonNegativeOnlySolver(lengthsolver)
     
     def generate(self, index):
         value = self.valuesolver[index]
-        length = self.lengthsolver[index]
+        length = base.length(self.lengthsolver[index])
         return [value] * length
+    
+    def codegen(self, compiler):
+        return "[%s] * %s" % (compiler.call(self.valuesolver), compiler.call(self.lengthsolver))
 
     def score(self):
         return 0.8 * self.valuesolver.score() * self.lengthsolver.score()
@@ -138,22 +185,33 @@ class RepeatListSolver(base.BaseSolver):
 class YListSolver(base.BaseSolver):
     '''Lists have constant length. Each value has it's own solver.
     '''
+    __slots__ = ('solvers',)
+    maxscore = 0.8
     can_do_negative = True
     
     def analyze(self):
         listlen = len(self.series[0])
         for s in self.series:
             if len(s) != listlen:
-                raise base.UnsolvableException
+                return False
         
+        # Identical columns are solved once by the solving cache of the selection
         self.solvers = []
-        for i in range(listlen):
-            series = [s[i] for s in self.series]
-            self.solvers.append(complexnumeric.CombinedNumericSolver(series))
+        for column in zip(*self.series):
+            solver = complexnumeric.CombinedNumericSolver.try_solve(list(column))
+            if solver is None:
+                return False
+            
+            self.solvers.append(solver)
+        
+        return True
     
     def generate(self, index):
         return [solver[index] for solver in self.solvers]
     
+    def codegen(self, compiler):
+        return "[%s]" % ', '.join([compiler.call(solver) for solver in self.solvers])
+    
     def score(self):
         score = 0.80
         for solver in self.solvers:
@@ -170,6 +228,7 @@ class YListSolver(base.BaseSolver):
         return result
 
 class CombinedListSolver(base.SelectSolver):
+    __slots__ = ()
     _solverclasses = [AritmeticListSolver, VaryLengthListSolver, ReverseVaryLengthListSolver,
                       basenumeric.RecurringSolver, RepeatListSolver, YListSolver]
 
@@ -177,6 +236,7 @@ class CharListSolver(base.BaseSolver):
     '''Simple wrapper for lists of characters instead of lists of numbers.
     Does not handle overflows.
     '''
+    __slots__ = ('solver',)
     can_do_negative = True
     
     def analyze(self):
@@ -185,11 +245,17 @@ class CharListSolver(base.BaseSolver):
             numentry = [alphabet.ord(e) for e in s]
             numseries.append(numentry)
         
-        self.solver = CombinedListSolver(numseries)
+        self.solver = CombinedListSolver.try_solve(numseries)
+        return self.solver is not None
     
     def generate(self, index):
         entry = self.solver[index]
         return [alphabet.chr(s) for s in entry]
+    
+    def codegen(self, compiler):
+        value = compiler.variable()
+        return "[%s[%s %% %d] for %s in %s]" % (compiler.constant(alphabet.alphabet), value,
+                                               len(alphabet.alphabet), value, compiler.call(self.solver))
 
     def score(self):
         return self.solver.score()
@@ -215,5 +281,9 @@ if __name__ == '__main__':
     
     a = YListSolver([[5,1,1], [4,1,2], [3,1,3]])
     assert a.generatelist(2) == [[2,1,4], [1,1,5]]
+    
+    a = YListSolver([[1,5,1], [2,5,2], [3,5,3]])
+    assert a.generatelist(1) == [[4,5,4]]
+    assert base.unwrap(a.solvers[0]) is base.unwrap(a.solvers[2]) # From the solving cache
 
     print("OK")
@@ -0,0 +1,140 @@
+'''Memory used by the caches of the library:
+
+from lib import memory
+
+... solve a lot of series ...
+print memory.report()
+
+=> {'caches': {'solvingcache': 1103528, 'generated': 412056, 'primes': 2552},
+    'classes': {'AritmeticSolver': 288400, ...}, 'total': 2803944}
+
+The solving cache of the selections keeps the solver trees found, and each
+solver keeps the entries it has generated. The sizes are the bytes retained
+by them, counting each object once:
+
+caches        The solving cache with its keys, the generated entries of the
+              solvers, and the primes generated by the global prime generator.
+classes       The solver objects by class, with their parameters and series.
+total         The sum of the above.
+'''
+
+import sys
+import types
+
+from . import base
+
+def deepsize(obj, seen):
+    '''Size of obj and everything reachable from it, counting each object once.
+    Classes, functions and modules are not counted.'''
+    if id(obj) in seen or isinstance(obj, (type, types.FunctionType, types.MethodType,
+                                           types.ModuleType)):
+        return 0
+    
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += deepsize(key, seen) + deepsize(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for value in obj:
+            size += deepsize(value, seen)
+    
+    if hasattr(obj, '__dict__'):
+        size += deepsize(obj.__dict__, seen)
+    
+    for name in _slots(type(obj)):
+        if hasattr(obj, name):
+            size += deepsize(getattr(obj, name), seen)
+    
+    return size
+
+def _slots(cls):
+    return [name for c in cls.__mro__ for name in c.__dict__.get('__slots__', ())]
+
+class _Account:
+    '''Sizes of the objects reachable from the caches. Solvers are counted by
+    their class and the caches of generated entries separately.'''
+    def __init__(self):
+        self.seen = set()
+        self.classes = {}
+        self.generated = 0
+    
+    def size(self, obj):
+        if isinstance(obj, base.Solver):
+            self.solver(obj)
+            return 0
+        
+        if id(obj) in self.seen or isinstance(obj, (type, types.FunctionType, types.MethodType,
+                                                    types.ModuleType)):
+            return 0
+        
+        self.seen.add(id(obj))
+        size = sys.getsizeof(obj)
+        
+        if isinstance(obj, dict):
+            for key, value in obj.items():
+                size += self.size(key) + self.size(value)
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            for value in obj:
+                size += self.size(value)
+        
+        return size
+    
+    def solver(self, solver):
+        if id(solver) in self.seen:
+            return
+        
+        self.seen.add(id(solver))
+        size = sys.getsizeof(solver)
+        
+        for name in _slots(type(solver)):
+            try:
+                value = object.__getattribute__(solver, name) # Not through WrapperSolver.__getattr__
+            except AttributeError:
+                continue
+            
+            if name == 'cache':
+                self.generated += self.size(value)
+            else:
+                size += self.size(value)
+        
+        name = solver.__class__.__name__
+        self.classes[name] = self.classes.get(name, 0) + size
+
+def report():
+    '''Return the bytes retained by the caches, see the module documentation.'''
+    from .primes import prime_generator
+    
+    account = _Account()
+    account.seen.add(id(prime_generator))
+    primes = account.size(getattr(prime_generator, 'cache', {}))
+    solvingcache = account.size(base.SelectSolver._solvingcache)
+    
+    caches = {'solvingcache': solvingcache, 'generated': account.generated, 'primes': primes}
+    return {'caches': caches,
+            'classes': account.classes,
+            'total': sum(caches.values()) + sum(account.classes.values())}
+
+if __name__ == '__main__':
+    print("Unit testing")
+    
+    from .combinedsolver import CombinedSolver
+    
+    base.clearcache()
+    empty = report()
+    assert empty['caches']['generated'] == 0 and empty['classes'] == {}
+    
+    a = CombinedSolver(['2', '3', '5', '7', '11'])
+    a.generatelist(10)
+    result = report()
+    assert result['caches']['primes'] > empty['caches']['primes']
+    assert result['caches']['generated'] > 0
+    assert result['classes']['PrimeSolver'] > 0
+    
+    from .primes import prime_generator
+    seen = set([id(prime_generator)])
+    primes = deepsize(prime_generator.cache, seen)
+    assert result['total'] == primes + deepsize(base.SelectSolver._solvingcache, seen)
+    
+    print("OK")
@@ -3,19 +3,28 @@ from . import tools
 from . import basestring
 
 class BaseMethodSolver(base.BaseSolver):
+    __slots__ = ('solver',)
     def simplify(self, s):
-        '''Reimplemented by subclass. Convert string to a simple series, ABCBA -> ABC'''
+        '''Reimplemented by subclass. Convert string to a simple series, ABCBA -> ABC.
+        Returns None if the string can't be converted.'''
     
     def modify(self, s):
         '''Reimplemented by subclass. Convert simple series to more complex series.'''
     
     def analyze(self):
         series = [self.simplify(s) for s in self.series]
-        self.solver = basestring.BaseStringSolver(series)
+        if None in series:
+            return False
+        
+        self.solver = basestring.BaseStringSolver.try_solve(series)
+        return self.solver is not None
     
     def generate(self, index):
         return self.modify(self.solver[index])
     
+    def codegen(self, compiler):
+        return "%s(%s)" % (compiler.constant(self.modify), compiler.call(self.solver))
+    
     def score(self):
         return self.solver.score()
     
@@ -23,6 +32,7 @@ class BaseMethodSolver(base.BaseSolver):
         return {'solver': self.solver}
 
 class MirrorStringSolver(BaseMethodSolver):
+    __slots__ = ()
     def simplify(self, s):
         return tools.mirrorstring(s)
     
@@ -30,6 +40,7 @@ class MirrorStringSolver(BaseMethodSolver):
         return tools.mirrorstring(s)
 
 class OddAlternateMirrorStringSolver(BaseMethodSolver):
+    __slots__ = ()
     mirrormodulus = 1
     def simplify(self, s, index):
         if index % 2 == self.mirrormodulus:
@@ -41,87 +52,71 @@ class OddAlternateMirrorStringSolver(BaseMethodSolver):
     
     def analyze(self):
         series = [self.simplify(self.series[i], i) for i in range(len(self.series))]
-        self.solver = basestring.BaseStringSolver(series)
+        self.solver = basestring.BaseStringSolver.try_solve(series)
+        return self.solver is not None
     
     def generate(self, index):
         return self.modify(self.solver[index], index)
+    
+    def codegen(self, compiler):
+        return "%s(%s, i)" % (compiler.constant(self.modify), compiler.call(self.solver))
 
 class EvenAlternateMirrorStringSolver(OddAlternateMirrorStringSolver):
+    __slots__ = ()
     mirrormodulus = 0
 
 class SingleSymmetricStringSolver(BaseMethodSolver):
     '''A, ABA, ABCBA'''
+    __slots__ = ()
     def simplify(self, s):
-        start = s[:len(s) // 2 + 1]
-        end = tools.mirrorstring(s[len(s) // 2:])
+        if s != tools.mirrorstring(s) or (s and len(s) % 2 == 0):
+            return None
         
-        if start != end:
-            raise base.UnsolvableException
-        
-        return start
+        return s[:len(s) // 2 + 1]
 
     def modify(self, s):
         return s + tools.mirrorstring(s[:-1])
 
 class DoubleSymmetricStringSolver(BaseMethodSolver):
     '''AA, ABBA, ABCCBA'''
+    __slots__ = ()
     def simplify(self, s):
-        if len(s) % 2 != 0:
-            raise base.UnsolvableException
-        
-        start = s[:len(s) // 2]
-        end = tools.mirrorstring(s[len(s) // 2:])
-        
-        if start != end:
-            raise base.UnsolvableException
+        if len(s) % 2 != 0 or s != tools.mirrorstring(s):
+            return None
         
-        return start
+        return s[:len(s) // 2]
 
     def modify(self, s):
         return s + tools.mirrorstring(s)
 
 class OddFirstAlternateAppendStringSolver(BaseMethodSolver):
     '''Append a letter alternatingly to either end.'''
+    __slots__ = ()
+    maxscore = 0.6
     firstmodulus = 1
 
     def simplify(self, s):
         '''ECABD -> ABCDE'''
-        result = ""
-        
-        if len(s) % 2 == self.firstmodulus: # Last char added was in the end
-            result = s[-1]
-            s = s[:-1]
-        
-        while s:
-            result = s[0] + result
-            s = s[1:]
-            
-            if not s:
-                break
-            
-            result = s[-1] + result
-            s = s[:-1]
-        
-        return result
+        # The letters at indexes firstmodulus, firstmodulus + 2, ... were added to
+        # the start, so they are there in reverse order. The rest are at the end.
+        prepended = (len(s) + 1 - self.firstmodulus) // 2
+        result = [None] * len(s)
+        result[self.firstmodulus::2] = s[prepended - 1::-1] if prepended else ''
+        result[1 - self.firstmodulus::2] = s[prepended:]
+        return ''.join(result)
 
     def modify(self, s):
-        result = ""
-        
-        for i in range(len(s)):
-            if i % 2 == self.firstmodulus:
-                result = s[i] + result
-            else:
-                result = result + s[i]
-        
-        return result
+        return s[self.firstmodulus::2][::-1] + s[1 - self.firstmodulus::2]
 
     def score(self):
         return self.solver.score() * 0.6
 
 class EvenFirstAlternateAppendStringSolver(OddFirstAlternateAppendStringSolver):
+    __slots__ = ()
     firstmodulus = 0
 
 class MethodStringSolver(base.SelectSolver):
+    __slots__ = ()
     _solverclasses = [MirrorStringSolver, SingleSymmetricStringSolver, DoubleSymmetricStringSolver, EvenFirstAlternateAppendStringSolver,
                       OddFirstAlternateAppendStringSolver, OddAlternateMirrorStringSolver, EvenAlternateMirrorStringSolver]
 
@@ -131,4 +126,9 @@ if __name__ == '__main__':
     a = MethodStringSolver(['A', 'ABA', 'ABCBA'])
     assert a.generatelist(2) == ['ABCDCBA', 'ABCDEDCBA']
     
+    a = EvenFirstAlternateAppendStringSolver.__new__(EvenFirstAlternateAppendStringSolver)
+    assert a.simplify('ECABD') == 'ABCDE'
+    assert a.modify('ABCDE') == 'ECABD'
+    assert a.simplify(a.modify('ABCDEF')) == 'ABCDEF'
+    
     print("OK")
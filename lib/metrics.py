@@ -0,0 +1,151 @@
+'''Counters and timers for each solver class, to see where the search time
+goes:
+
+from lib import metrics
+
+metrics.enable()
+... solve some series ...
+print metrics.snapshot()['GeometricSolver']
+
+=> {'attempts': 1517, 'successes': 212, 'rejections': 1305, 'time': 0.0112, ...}
+
+The fields are:
+
+attempts     Number of analyze() calls, ie. series tried with the class.
+successes    Attempts that gave a solver.
+rejections   Attempts that failed, by returning False or raising UnsolvableException.
+time         Seconds spent in analyze(), including the solvers tried by it.
+selftime     Same, without the time of the solvers tried by it.
+validations  Number of matches() and validate() calls.
+generated    Number of generate() calls, for validating and for new entries.
+cachehits    Entries found in the cache of generated entries. For the
+cachemisses  selections, series found in the solving cache.
+
+For the selection classes, analyze() means the search done by the selection.
+The metrics are collected with base.addobserver(), so there is no overhead
+when they are disabled.
+'''
+
+import time
+import threading
+
+from . import base
+
+FIELDS = ('attempts', 'successes', 'rejections', 'time', 'selftime',
+          'validations', 'generated', 'cachehits', 'cachemisses')
+
+active = False
+timer = time.perf_counter
+
+_counters = {} # class => values of FIELDS
+_lock = threading.Lock() # Guards the counters, the searches of all threads update them
+
+def _countersof(cls):
+    '''The counters of cls. Called with _lock held.'''
+    try:
+        return _counters[cls]
+    except KeyError:
+        counters = _counters[cls] = [0, 0, 0, 0., 0., 0, 0, 0, 0]
+        return counters
+
+def _add(cls, field, value = 1):
+    with _lock:
+        _countersof(cls)[field] += value
+
+class _Metrics(base.Observer, threading.local):
+    def __init__(self):
+        self.stack = [] # [start time, time of the nested analyses] for each analyze() in progress, per thread
+    
+    def begin(self, solver, series):
+        _add(solver.__class__, 0)
+        self.stack.append([timer(), 0.])
+    
+    def end(self, solver, success):
+        start, childtime = self.stack.pop()
+        elapsed = timer() - start
+        
+        with _lock:
+            counters = _countersof(solver.__class__)
+            counters[1 if success else 2] += 1
+            counters[3] += elapsed
+            counters[4] += elapsed - childtime
+        
+        if self.stack:
+            self.stack[-1][1] += elapsed
+    
+    def validated(self, solver):
+        _add(solver.__class__, 5)
+    
+    def generated(self, solver):
+        _add(solver.__class__, 6)
+    
+    def cachelookup(self, cls, hit):
+        _add(cls, 7 if hit else 8)
+
+_observer = _Metrics()
+
+def enable():
+    '''Start collecting the metrics.'''
+    global active
+    if not active:
+        active = True
+        base.addobserver(_observer)
+
+def disable():
+    '''Stop collecting. The metrics are kept.'''
+    global active
+    if active:
+        active = False
+        base.removeobserver(_observer)
+
+def reset():
+    '''Set all the metrics to zero.'''
+    with _lock:
+        _counters.clear()
+
+def snapshot():
+    '''Return the metrics as {class name: {field: value}}, for the classes that
+    have been used.'''
+    with _lock:
+        return dict((cls.__name__, dict(zip(FIELDS, values))) for cls, values in _counters.items())
+
+if __name__ == '__main__':
+    print("Unit testing")
+    
+    from . import metrics # The module used by the solvers, not __main__
+    from .combinedsolver import CombinedSolver
+    
+    base.clearcache()
+    metrics.enable()
+    assert CombinedSolver(['1', '2', '4', '8', '16']).generatelist(3) == ['32', '64', '128']
+    CombinedSolver(['1', '2', '4', '8', '16'])
+    metrics.disable()
+    
+    result = metrics.snapshot()
+    assert result['GeometricSolver']['successes'] >= 1
+    assert result['GeometricSolver']['generated'] >= 3
+    assert result['AritmeticSolver']['rejections'] >= 1
+    assert result['CombinedSolver']['attempts'] == 2
+    assert result['CombinedNumericSolver']['cachehits'] >= 1 # Solved again
+    assert 0 <= result['CombinedSolver']['selftime'] <= result['CombinedSolver']['time']
+    assert type(base.SelectSolver._solvingcache) is dict
+    
+    metrics.reset()
+    CombinedSolver(['A', 'B', 'C'])
+    assert metrics.snapshot() == {}
+    
+    # Events from several threads at once are all counted
+    def work():
+        for i in range(10000):
+            metrics._observer.validated(a)
+    
+    a = CombinedSolver(['A', 'B', 'C'])
+    threads = [threading.Thread(target = work) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert metrics.snapshot()['CombinedSolver']['validations'] == 40000
+    metrics.reset()
+    
+    print("OK")
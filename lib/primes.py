@@ -4,6 +4,7 @@ import math
 
 class PrimeGenerator(base.GeneratingSolver):
     '''Generates the sequence of prime numbers.'''
+    __slots__ = ()
     def is_prime(self, max_index, candidate):
         i = 0
         while i < max_index and self[i] <= math.sqrt(candidate):
@@ -31,6 +32,8 @@ prime_generator = PrimeGenerator()
 
 class PrimeSolver(base.BaseSolver):
     '''Solve for a sequence of prime numbers, maybe skipping some of them.'''
+    __slots__ = ('positionsolver',)
+    maxscore = 0.1
     can_do_negative = True
     
     def analyze(self):
@@ -44,22 +47,26 @@ class PrimeSolver(base.BaseSolver):
             prime = prime_generator[i]
             
             if prime > limit:
-                raise base.UnsolvableException
+                return False
             
             for s_index, s_entry in enumerate(self.series):
                 if s_entry == prime:
                     positions[s_index] = i
                 elif s_entry % prime == 0:
-                    raise base.UnsolvableException
+                    return False
             
             i += 1
         
         # Solve the series of positions
-        self.positionsolver = basenumeric.BaseNumericSolver(positions)
+        self.positionsolver = basenumeric.BaseNumericSolver.try_solve(positions)
+        return self.positionsolver is not None
     
     def generate(self, index):
         position = self.positionsolver[index]
         return prime_generator[position]
+    
+    def codegen(self, compiler):
+        return "%s[%s]" % (compiler.constant(prime_generator), compiler.call(self.positionsolver))
 
     def params(self):
         return {'positionsolver': self.positionsolver}
@@ -9,11 +9,13 @@ are faster.
 class FibonacciSolver(base.BaseSolver):
     '''The fibonacci series with custom two first values
     '''
+    __slots__ = ()
+    maxscore = 0.6
     minimum_entries = 3
     can_do_negative = False
     
     def analyze(self):
-        self.validate(start = 2)
+        return self.matches(start = 2)
     
     def generate(self, index):
         return self[index - 2] + self[index - 1]
@@ -41,21 +43,35 @@ class RecursiveExponentSolver(base.BaseSolver):
     '''Next value is previous value raised to some exponent.
     2, 4, 16, 256 etc.
     '''
+    __slots__ = ('first', 'exponent')
+    maxscore = 0.7
     minimum_entries = 3
     can_do_negative = False
     
     def analyze(self):
         if self.series[0] == 1 or self.series[0] <= 0 or self.series[1] <= 0:
-            raise base.UnsolvableException # Avoid math problems
+            return False # Avoid math problems
         
         self.exponent = int(math.log(self.series[1]) / math.log(self.series[0]))
         self.first = self.series[0]
         
-        self.validate(start = 1) # We need to validate index 1 also, to check for rounding errors
+        return self.matches(start = 1) # We need to validate index 1 also, to check for rounding errors
     
     def generate(self, index):
+        if base._state.maxdigits is not None:
+            try:
+                digits = self.exponent ** float(index) * math.log10(self.first)
+            except OverflowError:
+                digits = math.inf
+            
+            if digits > base._state.maxdigits:
+                return base.BigNumber("%d^(%d^%d)" % (self.first, self.exponent, index), digits)
+        
         return self.first ** (self.exponent ** index)
     
+    def codegen(self, compiler):
+        return "%r ** (%r ** i)" % (self.first, self.exponent)
+    
     def score(self):
         if self.exponent == 2:
             return 0.7
@@ -69,17 +85,35 @@ class RecursiveExponentSolver(base.BaseSolver):
 class FactorialSolver(base.BaseSolver):
     '''Next value is previous value multiplied by sequence index. Supports
     index offsetting: [1, 2, 6, 24] and [6, 24] both work.'''
+    __slots__ = ('baseindex',)
+    maxscore = 0.05
     minimum_entries = 2
     can_do_negative = True
     
     def analyze(self):
         if self.series[0] == 0:
-            raise base.UnsolvableException
+            return False
         
         self.baseindex = self.series[1] // self.series[0] - 1
-        self.validate(start = 1)
-
+        return self.matches(start = 1)
+    
     def generate(self, index):
+        if base._state.maxdigits is not None and index > 0 and self.baseindex >= 0:
+            # first * (index + baseindex)! / baseindex!
+            digits = math.log10(abs(self.series[0])) + (math.lgamma(index + self.baseindex + 1) -
+                                                        math.lgamma(self.baseindex + 1)) / math.log(10)
+            if digits > base._state.maxdigits:
+                # The factorial is computed only if the first entry is as long as
+                # it, otherwise it would be the work the budget avoids
+                first = abs(self.series[0])
+                if (abs(math.log10(first) - math.lgamma(self.baseindex + 1) / math.log(10)) < 1e-6 and
+                        self.series[0] == math.factorial(self.baseindex)):
+                    formula = "%d!" % (index + self.baseindex)
+                else:
+                    formula = "%d*%d!/%d!" % (self.series[0], index + self.baseindex, self.baseindex)
+                
+                return base.BigNumber(formula, digits)
+        
         if index > 0:
             return self[index - 1] * (index + self.baseindex)
         else:
@@ -94,6 +128,134 @@ class FactorialSolver(base.BaseSolver):
         else:
             return 0.01
 
+def berlekampmassey(series, maxorder = None):
+    '''Find the shortest linear recurrence satisfied by series. Returns the list
+    of coefficients c for a[n] = c[0] * a[n-1] + ... + c[k-1] * a[n-k], or None if
+    they are not all integers or there are more than maxorder of them. Works over
+    the rationals, but fraction free: the connection polynomial is kept scaled
+    to integers.
+    '''
+    current = [1] # Connection polynomial, scaled by an arbitrary nonzero factor
+    previous = [1]
+    length = 0
+    shift = 1
+    discrepancy = 1 # Of the previous polynomial, when it was replaced
+    
+    for n in range(len(series)):
+        d = 0
+        for i in range(min(length, len(current) - 1) + 1):
+            d += current[i] * series[n - i]
+        
+        if d == 0:
+            shift += 1
+            continue
+        
+        # current = discrepancy * current - d * x^shift * previous
+        old = current
+        current = [discrepancy * c for c in current]
+        current += [0] * (len(previous) + shift - len(current))
+        for i in range(len(previous)):
+            current[i + shift] -= d * previous[i]
+        
+        divisor = math.gcd(*current)
+        if divisor != 1:
+            current = [c // divisor for c in current]
+        
+        if 2 * length <= n:
+            length = n + 1 - length
+            if maxorder is not None and length > maxorder:
+                return None # The order never decreases
+            
+            previous = old
+            discrepancy = d
+            shift = 1
+        else:
+            shift += 1
+    
+    current += [0] * (length + 1 - len(current))
+    coefficients = []
+    for c in current[1 : length + 1]:
+        if c % current[0] != 0:
+            return None
+        
+        coefficients.append(-c // current[0])
+    
+    return coefficients
+
+class LinearRecurrenceSolver(base.BaseSolver):
+    '''Any linear recurrence with integer coefficients, such as 1,2,5,12,29
+    (a[n] = 2 * a[n-1] + a[n-2]). The shortest recurrence is found with
+    Berlekamp-Massey, so the special cases like AritmeticSolver, GeometricSolver
+    and FibonacciSolver are matched too, but they win the ties.
+    '''
+    __slots__ = ('coefficients',)
+    maxscore = 0.1
+    minimum_entries = 6 # Order 1 is covered by GeometricSolver, order 2 needs 4 + 2 entries
+    can_do_negative = False
+    maxorder = 8 # Berlekamp-Massey is quadratic in the entries, with growing integers
+    
+    def analyze(self):
+        for value in self.series:
+            if type(value) is not int:
+                return False
+        
+        # Each entry after the first 2k checks the recurrence of order k,
+        # at least two checks are required. The recurrence is found from the
+        # entries needed for the highest order, and the rest are only validated.
+        prefix = self.series[:2 * self.maxorder + 2]
+        self.coefficients = berlekampmassey(prefix, (len(prefix) - 2) // 2)
+        if not self.coefficients: # None or empty for all zeros
+            return False
+        
+        return self.matches(start = len(prefix))
+    
+    def _multiply(self, a, b):
+        '''Multiply two polynomials modulo the characteristic polynomial.'''
+        order = len(self.coefficients)
+        product = [0] * (2 * order - 1)
+        for i, x in enumerate(a):
+            if x:
+                for j, y in enumerate(b):
+                    product[i + j] += x * y
+        
+        # x^order = c[0] * x^(order-1) + ... + c[order-1]
+        for degree in range(2 * order - 2, order - 1, -1):
+            value = product[degree]
+            if value:
+                for j, c in enumerate(self.coefficients):
+                    product[degree - 1 - j] += value * c
+        
+        return product[:order]
+    
+    def generate(self, index):
+        # The entry is a combination of the first k entries, with the
+        # coefficients of x^index modulo the characteristic polynomial.
+        order = len(self.coefficients)
+        result = [1] + [0] * (order - 1)
+        power = [0, 1] + [0] * (order - 2) if order > 1 else [self.coefficients[0]]
+        
+        while index:
+            if index & 1:
+                result = self._multiply(result, power)
+            power = self._multiply(power, power)
+            index >>= 1
+        
+        return sum(r * self.series[i] for i, r in enumerate(result))
+    
+    def codegen(self, compiler):
+        return "%s(i)" % compiler.constant(self.generate)
+    
+    def score(self):
+        # Never above the special cases, eg. FibonacciSolver with non-standard start
+        if len(self.series) - 2 * len(self.coefficients) >= 3:
+            return 0.1
+        else:
+            return 0.05
+    
+    def params(self):
+        return {'coefficients': self.coefficients,
+                'first': self.series[:len(self.coefficients)]}
+
 if __name__ == '__main__':
     print("Unit tests")
     
@@ -102,8 +264,31 @@ if __name__ == '__main__':
     
     a = RecursiveExponentSolver([3, 3**2, 3**4])
     assert a.generatelist(2) == [3**8, 3**16]
+    assert [str(v) for v in a.generatelist(50, maxdigits = 10000)[-2:]] == ['3^(2^51)', '3^(2^52)']
+    assert a.generatelist(2) == [3**8, 3**16] # Not cached
     
     a = FactorialSolver([1, 2, 6])
     assert a.generatelist(2) == [24, 120]
+    assert str(a.generatelist(20, maxdigits = 10)[-1]) == '23!'
+    a = FactorialSolver([1, 10**6, 10**6 * (10**6 + 1)])
+    assert [str(v) for v in a.generatelist(3, maxdigits = 20)[1:]] == ['1*1000003!/999999!', '1*1000004!/999999!']
+    a = FactorialSolver([120, 720, 5040])
+    assert str(a.generatelist(20, maxdigits = 10)[-1]) == '27!'
+    
+    assert berlekampmassey([1, 1, 2, 3, 5, 8]) == [1, 1]
+    assert berlekampmassey([1, 2, 4, 8, 16]) == [2]
+    assert berlekampmassey([1, 3, 2, 5, 4]) is None # Rational coefficients
+    
+    a = LinearRecurrenceSolver([1, 2, 5, 12, 29, 70])
+    assert a.generatelist(2) == [169, 408]
+    values = [1, 2]
+    while len(values) <= 100:
+        values.append(2 * values[-1] + values[-2])
+    assert a[100] == values[100]
+    
+    # Long series: the recurrence is found from the start and validated on the rest
+    assert LinearRecurrenceSolver.try_solve(values).coefficients == [2, 1]
+    assert LinearRecurrenceSolver.try_solve(values[:50] + [0] + values[51:]) is None
+    assert LinearRecurrenceSolver.try_solve([i * i * i * i * i * i * i * i * i for i in range(30)]) is None # Order 10
 
     print("OK")
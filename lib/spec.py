@@ -0,0 +1,198 @@
+'''Export a solved solver tree as a compact spec and load it back without
+analyzing the series again. The spec consists only of dicts, lists, strings
+and numbers, so it can be stored as JSON:
+
+import lib
+from lib import spec
+
+s = lib.Solver(['A1', 'B2', 'C3'])
+text = spec.dumps(s)
+print text
+
+=> {"version": 2, "solver": {"@": "combinedsolver.SplitSolver", "series": ["A1", "B2", "C3"], ...},
+    "selection": "combinedsolver.CombinedSolver"}
+
+print spec.loads(text).generatelist(2)
+
+=> ['D4', 'E5']
+
+Each solver is a dict with the solver class in key '@' and its attributes
+(as returned by base.fields()) in the other keys. A solver used in several
+places of the tree is written once with its number in key '#', and the other
+places are {"=": number}. The selection class of the solver, if any, is in
+'selection', so that the loaded solver can be extended. Only solver classes
+and their fields from this library can be loaded.
+'''
+
+import json
+import importlib
+
+from . import base
+
+VERSION = 2
+
+def _count(value, counts):
+    '''Count the references to each solver, walking a shared solver only once.'''
+    if isinstance(value, base.Solver):
+        solver = base.unwrap(value)
+        counts[id(solver)] = counts.get(id(solver), 0) + 1
+        if counts[id(solver)] == 1:
+            for name, field in base.fields(solver):
+                _count(field, counts)
+    
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            _count(v, counts)
+
+def _export(value, counts, ids):
+    if isinstance(value, base.Solver):
+        solver = base.unwrap(value)
+        if id(solver) in ids:
+            return {'=': ids[id(solver)]}
+        
+        result = {'@': _name(solver.__class__)}
+        if counts[id(solver)] > 1:
+            ids[id(solver)] = result['#'] = len(ids)
+        
+        for name, field in base.fields(solver):
+            result[name] = _export(field, counts, ids)
+        
+        return result
+    
+    elif isinstance(value, (list, tuple)):
+        return [_export(v, counts, ids) for v in value]
+    
+    elif value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    
+    else:
+        raise TypeError("Can't export %r" % (value,))
+
+def _name(cls):
+    return cls.__module__.split('.')[-1] + '.' + cls.__name__
+
+def export(solver):
+    '''Return the spec of a solver.'''
+    counts = {}
+    _count(solver, counts)
+    result = {'version': VERSION, 'solver': _export(solver, counts, {})}
+    
+    if isinstance(solver, base.BaseSelectSolver):
+        result['selection'] = _name(solver.__class__)
+    
+    return result
+
+_classcache = {}
+
+def _class(name):
+    '''Find the solver class by name, only allowing classes from this package.'''
+    if name not in _classcache:
+        module, dot, clsname = name.partition('.')
+        if not module.isidentifier() or not clsname.isidentifier():
+            raise ValueError("Invalid solver class %r" % name)
+        
+        try:
+            cls = getattr(importlib.import_module('.' + module, __package__), clsname, None)
+        except ImportError:
+            cls = None
+        
+        if not isinstance(cls, type) or not issubclass(cls, base.Solver):
+            raise ValueError("Invalid solver class %r" % name)
+        
+        _classcache[name] = cls
+    
+    return _classcache[name]
+
+def _load(value, shared):
+    if isinstance(value, dict):
+        if '=' in value:
+            if value['='] not in shared:
+                raise ValueError("Unknown solver reference %r" % (value['='],))
+            
+            return shared[value['=']]
+        
+        cls = _class(value['@'])
+        names = base.fieldnames(cls)
+        solver = cls.__new__(cls) # No __init__, it would analyze the series
+        if '#' in value:
+            shared[value['#']] = solver
+        
+        for name, field in value.items():
+            if name in ('@', '#'):
+                continue
+            
+            if names is not None and name not in names:
+                raise ValueError("Invalid field %r for %s" % (name, value['@']))
+            
+            setattr(solver, name, _load(field, shared))
+        
+        return solver
+    
+    elif isinstance(value, list):
+        return [_load(v, shared) for v in value]
+    
+    else:
+        return value
+
+def load(spec):
+    '''Create the solver described by spec.'''
+    if spec.get('version') not in (1, VERSION):
+        raise ValueError("Unsupported spec version %r" % spec.get('version'))
+    
+    solver = _load(spec['solver'], {})
+    
+    if 'selection' in spec:
+        cls = _class(spec['selection'])
+        if not issubclass(cls, base.BaseSelectSolver):
+            raise ValueError("Invalid selection class %r" % spec['selection'])
+        
+        selection = cls.__new__(cls)
+        selection._solver = solver
+        solver = selection
+    
+    return solver
+
+def dumps(solver):
+    '''Return the spec of a solver as JSON text.'''
+    return json.dumps(export(solver), separators = (',', ':'))
+
+def loads(text):
+    '''Create a solver from JSON text returned by dumps().'''
+    return load(json.loads(text))
+
+if __name__ == '__main__':
+    print("Unit testing")
+    
+    from . import tools
+    from .combinedsolver import CombinedSolver
+    
+    for series in (['A50X', 'B100XX', 'C200XXX'], ['A', 'AAB', 'AAABBC'], ['1', '1', '2', '3', '5'],
+                   ['A', 'BB', 'CCC', 'DDDD', 'EEEEE', 'FFFFFF'], ['001', '002', '003']):
+        a = CombinedSolver(series)
+        b = loads(dumps(a))
+        assert b.generatelist(5) == a.generatelist(5)
+        assert tools.describe_lines(b) == tools.describe_lines(a)
+    
+    a = CombinedSolver(['A1A', 'B2B', 'C3C'])
+    text = dumps(a)
+    assert text.count('basestring.SingleCharSolver') == 1 # Shared by both ends
+    b = loads(text)
+    assert b.endsolver.endsolver is b.startsolver
+    assert b.generatelist(2) == ['D4D', 'E5E']
+    assert b.extend(['D4D']).generatelist(1) == ['E5E']
+    assert isinstance(b, CombinedSolver)
+    
+    for bad in ({'version': VERSION, 'solver': {'@': 'os.system'}},
+                {'version': VERSION, 'solver': {'@': 'basenumeric.AritmeticSolver', '__class__': 1}},
+                {'version': VERSION, 'solver': {'=': 0}}):
+        try:
+            load(bad)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError
+    
+    assert load({'version': 1, 'solver': {'@': 'basenumeric.AritmeticSolver', 'series': [1, 2],
+                                          'first': 1, 'difference': 1}}).generatelist(1) == [3]
+    
+    print("OK")
@@ -0,0 +1,218 @@
+'''Statistics of which solver classes win the selections, used for trying
+the likely winner first:
+
+from lib import stats
+
+stats.enable()
+... solve a lot of series ...
+stats.save('stats.json')
+
+and later, eg. in another process:
+
+stats.load('stats.json')
+
+The statistics are kept separately for each selection class and for a
+cheap signature of the series: its length, the kind of its entries and
+whether it is monotonic. The order only affects the speed, as a selection
+skips candidates only when their maximum score can't beat the best found
+so far, and equal scores are still won by the candidate listed first.
+'''
+
+import time
+import threading
+
+VERSION = 1
+
+active = False # Use the statistics to order the candidates
+recording = False # Collect statistics from the selections
+timer = time.perf_counter
+
+_stats = {} # (selection name, signature) => {class name: [tries, wins, seconds]}
+_orders = {} # (selection class, signature) => candidate classes in the order to try
+_reorderinterval = 1000 # Recompute the orders after this many recorded selections
+_recorded = 0
+_lock = threading.Lock() # Guards the statistics and the orders between the threads
+
+def enable(record = True):
+    '''Start ordering the candidates by the statistics, and recording them if record is set.'''
+    global active, recording
+    active = True
+    recording = record
+
+def disable():
+    '''Stop ordering and recording. The statistics are kept.'''
+    global active, recording
+    active = False
+    recording = False
+
+def reset():
+    '''Forget all the statistics.'''
+    global _recorded
+    with _lock:
+        _stats.clear()
+        _orders.clear()
+        _recorded = 0
+
+def kindof(value):
+    '''Kind of an entry: list, num, alpha or mixed.'''
+    if isinstance(value, list):
+        return 'list'
+    elif isinstance(value, int) or value.isdigit():
+        return 'num'
+    elif value.isalpha():
+        return 'alpha'
+    else:
+        return 'mixed'
+
+def numberof(value):
+    '''An entry as a number: its value for numbers, otherwise its length.'''
+    if isinstance(value, int):
+        return value
+    elif isinstance(value, str) and value.isdigit():
+        return int(value)
+    else:
+        return len(value)
+
+def signature(series):
+    '''Cheap features of a series: length bucket, kind of entries and monotonicity.'''
+    if len(series) <= 3:
+        length = 'short'
+    elif len(series) <= 6:
+        length = 'medium'
+    else:
+        length = 'long'
+    
+    kinds = set(kindof(s) for s in series)
+    kind = kinds.pop() if len(kinds) == 1 else 'mixed'
+    
+    numbers = [numberof(s) for s in series]
+    differences = set((b > a) - (b < a) for a, b in zip(numbers, numbers[1:]))
+    if differences <= set([0]):
+        monotonic = 'constant'
+    elif differences <= set([0, 1]):
+        monotonic = 'increasing'
+    elif differences <= set([0, -1]):
+        monotonic = 'decreasing'
+    else:
+        monotonic = 'none'
+    
+    return (length, kind, monotonic)
+
+def record(selection, signature, tried, winner):
+    '''Record a selection: tried is a list of (class, seconds) and winner the winning class or None.'''
+    global _recorded
+    with _lock:
+        classes = _stats.setdefault((selection.__name__, signature), {})
+        
+        for cls, seconds in tried:
+            entry = classes.setdefault(cls.__name__, [0, 0, 0.])
+            entry[0] += 1
+            entry[1] += (cls is winner)
+            entry[2] += seconds
+        
+        _recorded += 1
+        if _recorded % _reorderinterval == 0:
+            _orders.clear()
+
+def order(selection, signature, candidates):
+    '''Return candidates in the order of decreasing win rate for the signature.
+    Ties, eg. classes without statistics, keep their original order.
+    '''
+    key = (selection, signature)
+    result = _orders.get(key)
+    if result is None:
+        with _lock:
+            classes = _stats.get((selection.__name__, signature), {})
+            
+            def winrate(cls):
+                tries, wins, seconds = classes.get(cls.__name__, (0, 0, 0.))
+                return -wins / tries if tries else 0.
+            
+            result = sorted(candidates, key = winrate)
+            _orders[key] = result # Another thread can clear it before it's returned
+    
+    return result
+
+def save(filename):
+    '''Write the statistics to a JSON file.'''
+    import json # Not at the top, it would slow down importing the library
+    with _lock:
+        entries = [{'selection': selection, 'signature': list(signature),
+                    'classes': {name: list(entry) for name, entry in classes.items()}}
+                   for (selection, signature), classes in sorted(_stats.items())]
+    
+    with open(filename, 'w') as f:
+        json.dump({'version': VERSION, 'stats': entries}, f, indent = 1)
+
+def load(filename, record = False):
+    '''Add the statistics from a JSON file written by save() and enable ordering.'''
+    import json
+    with open(filename) as f:
+        data = json.load(f)
+    
+    if data.get('version') != VERSION:
+        raise ValueError("Unsupported stats version %r" % data.get('version'))
+    
+    with _lock:
+        for entry in data['stats']:
+            classes = _stats.setdefault((entry['selection'], tuple(entry['signature'])), {})
+            for name, values in entry['classes'].items():
+                old = classes.setdefault(name, [0, 0, 0.])
+                for i in range(3):
+                    old[i] += values[i]
+        
+        _orders.clear()
+    enable(record)
+
+if __name__ == '__main__':
+    print("Unit testing")
+    
+    import os
+    import tempfile
+    from . import base
+    from . import stats # The module used by the solvers, not __main__
+    from .combinedsolver import CombinedSolver, SplitSolver
+    
+    assert stats.signature(['1', '2', '4', '8']) == ('medium', 'num', 'increasing')
+    assert stats.signature(['A1', 'B2', 'C3']) == ('short', 'mixed', 'constant')
+    
+    allseries = [['A1', 'B2', 'C3'], ['A50X', 'B100XX', 'C200XXX'], ['1', '1', '2', '3', '5'],
+                 ['A', 'AAB', 'AAABBC'], ['2', '3', '5', '9', '17']]
+    expected = [CombinedSolver(series).generatelist(3) for series in allseries]
+    
+    base.clearcache()
+    stats.enable()
+    assert [CombinedSolver(series).generatelist(3) for series in allseries] == expected
+    
+    filename = os.path.join(tempfile.mkdtemp(), 'stats.json')
+    stats.save(filename)
+    stats.reset()
+    stats.load(filename)
+    assert sum(entry[1] for classes in stats._stats.values() for entry in classes.values()) > 0
+    
+    base.clearcache()
+    assert [CombinedSolver(series).generatelist(3) for series in allseries] == expected
+    stats.disable()
+    os.remove(filename)
+    
+    # Recording and ordering from several threads, with the orders cleared often
+    stats.reset()
+    stats._reorderinterval = 3
+    classes = [CombinedSolver, SplitSolver]
+    orders = []
+    def work():
+        for i in range(300):
+            stats.record(CombinedSolver, ('short', 'num', 'none'), [(SplitSolver, 0.)], SplitSolver)
+            orders.append(stats.order(CombinedSolver, ('short', 'num', 'none'), classes)[0])
+    
+    threads = [threading.Thread(target = work) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert orders == [SplitSolver] * 1200
+    assert stats._stats[('CombinedSolver', ('short', 'num', 'none'))]['SplitSolver'][:2] == [1200, 1200]
+    stats._reorderinterval = 1000
+    stats.reset()
+    
+    print("OK")
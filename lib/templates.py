@@ -0,0 +1,138 @@
+'''Cache of solution shapes. Many series have the same structure as some
+series solved before, only with different letters or constants, eg.
+A50X B100XX C200XXX and K3Y L6YY M12YYY. The shape of a solution is the set
+of solver classes in its tree. The shapes are kept by a cheap signature of
+the series, and a new series with the same signature is first solved with
+the search restricted to the classes of the most common shapes:
+
+from lib import templates
+templates.enable()
+
+The full search is used if no shape gives a solution with score of at
+least minscore, and its solution is added to the cache. A restricted
+search can miss a better solution that uses other classes, so the cache
+is not enabled by default.
+'''
+
+import threading
+
+from . import base
+from . import stats
+
+active = False
+minscore = 0.5 # Lower scores from a template are not trusted
+tries = 3 # Number of shapes tried for a series
+maxshapes = 5 # Number of shapes kept for each signature
+
+_shapes = {} # signature => [[hits, classes], ...], most hits first
+_lock = threading.Lock() # Guards _shapes between the threads
+
+def enable():
+    global active
+    active = True
+
+def disable():
+    global active
+    active = False
+
+def reset():
+    '''Forget all the shapes.'''
+    with _lock:
+        _shapes.clear()
+
+def _pattern(value):
+    '''Kinds of the characters in value, repeats removed: 'A50XX' => 'a0a'.'''
+    result = ''
+    for c in str(value):
+        kind = '0' if c.isdigit() else 'a' if c.isalpha() else c
+        if not result.endswith(kind):
+            result += kind
+    
+    return result
+
+def signature(series):
+    '''The signature of lib.stats with the character patterns of the entries.'''
+    return stats.signature(series) + (tuple(sorted(set(_pattern(s) for s in series))),)
+
+def shape(solver):
+    '''Set of the solver classes in the tree of solver.'''
+    return frozenset(node.__class__ for node in base.nodes(base.unwrap(solver)))
+
+def learn(series, solver):
+    '''Add the shape of the solution of series to the cache.'''
+    classes = shape(solver)
+    key = signature(series)
+    
+    with _lock:
+        shapes = _shapes.setdefault(key, [])
+        
+        for entry in shapes:
+            if entry[1] == classes:
+                entry[0] += 1
+                break
+        else:
+            shapes.append([1, classes])
+        
+        shapes.sort(key = lambda entry: -entry[0])
+        del shapes[maxshapes:]
+
+def match(cls, series):
+    '''Solve series with selection class cls using the cached shapes. Returns
+    the solver or None if no shape gives a good enough solution.
+    '''
+    key = signature(series)
+    with _lock: # Not held while solving, the nested selections learn too
+        candidates = [classes for hits, classes in _shapes.get(key, [])[:tries]]
+    
+    for classes in candidates:
+        try:
+            solver = base.restricted(cls, series, classes)
+        except base.UnsolvableException:
+            continue
+        
+        if solver.score() >= minscore:
+            return solver
+    
+    return None
+
+if __name__ == '__main__':
+    print("Unit testing")
+    
+    from . import templates # The module used by the solvers, not __main__
+    from .combinedsolver import CombinedSolver
+    
+    assert _pattern('A50XX') == 'a0a'
+    
+    templates.enable()
+    a = CombinedSolver(['A50X', 'B100XX', 'C200XXX'])
+    assert len(templates._shapes) == 1
+    
+    b = CombinedSolver(['K3Y', 'L6YY', 'M12YYY'])
+    assert b.generatelist(2) == ['N24YYYY', 'O48YYYYY']
+    assert templates.shape(b) <= templates.shape(a)
+    assert templates._shapes[templates.signature(['K3Y', 'L6YY', 'M12YYY'])][0][0] == 1 # Not learned again
+    
+    assert templates.match(CombinedSolver, ['A', 'B', 'C']) is None # Different signature
+    templates.disable()
+    
+    # Learning and matching from several threads
+    templates.reset()
+    errors = []
+    def work(n):
+        try:
+            for i in range(200):
+                templates.learn(['A%d' % i, 'B%d' % n], a if i % 2 else b)
+                templates.match(CombinedSolver, ['A', 'B', 'C'])
+        except Exception as e:
+            errors.append(e)
+    
+    threads = [threading.Thread(target = work, args = (n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert all(len(shapes) <= maxshapes for shapes in templates._shapes.values())
+    templates.reset()
+    
+    print("OK")
@@ -44,9 +44,7 @@ def getprefix(string, char = None):
     return count
 
 def mirrorstring(string):
-    l = list(string)
-    l.reverse()
-    return ''.join(l)
+    return string[::-1]
 
 def recursivetuple(mylist):
     '''Convert a list to a tuple, recursively:
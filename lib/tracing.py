@@ -0,0 +1,108 @@
+'''Record a span for each solver tried in the search, to find out why a
+particular series is slow to solve:
+
+from lib import tracing
+
+tracing.start()
+lib.Solver(['A1', 'B2', 'C3'])
+tracing.stop()
+tracing.save('trace.json')
+
+The file is in the trace event format of Chrome, and can be opened in
+https://ui.perfetto.dev or chrome://tracing. Each span is one solver or
+selection class analyzing a series, nested in the span of the solver that
+tried it. The arguments of a span are the digest and length of the series,
+the depth in the search tree, the outcome and the score of the solution.
+'''
+
+import os
+import json
+import time
+import zlib
+import threading
+
+from . import base
+
+active = False
+timer = time.perf_counter
+
+def digest(series):
+    '''Short checksum of a series, the same for equal series in any process.'''
+    return '%08x' % zlib.crc32(repr(series).encode())
+
+class _Tracer(base.Observer, threading.local):
+    def __init__(self, events, origin):
+        # Called again in each thread, so the events and the origin are shared
+        self.events = events
+        self.stack = [] # (start time, series) for each analyze() in progress
+        self.origin = origin
+    
+    def begin(self, solver, series):
+        self.stack.append((timer(), series))
+    
+    def end(self, solver, success):
+        start, series = self.stack.pop()
+        duration = timer() - start
+        
+        args = {'series': digest(series),
+                'length': len(series),
+                'depth': len(self.stack),
+                'outcome': 'solved' if success else 'failed'}
+        if success:
+            args['score'] = solver.score()
+        
+        self.events.append({'name': solver.__class__.__name__, 'cat': 'solver', 'ph': 'X',
+                            'ts': (start - self.origin) * 1e6, 'dur': duration * 1e6,
+                            'pid': os.getpid(), 'tid': threading.get_native_id(), 'args': args})
+
+_tracer = _Tracer([], 0.)
+
+def start():
+    '''Start recording the spans. The previous ones are discarded.'''
+    global active, _tracer
+    stop()
+    _tracer = _Tracer([], timer())
+    active = True
+    base.addobserver(_tracer)
+
+def stop():
+    '''Stop recording. The spans are kept for trace() and save().'''
+    global active
+    if active:
+        active = False
+        base.removeobserver(_tracer)
+
+def trace():
+    '''Return the recorded spans in the trace event format.'''
+    return {'traceEvents': sorted(_tracer.events, key = lambda event: event['ts']),
+            'displayTimeUnit': 'ms'}
+
+def save(filename):
+    '''Write the recorded spans to a JSON file.'''
+    with open(filename, 'w') as f:
+        json.dump(trace(), f)
+
+if __name__ == '__main__':
+    print("Unit testing")
+    
+    from . import tracing # The module used by the solvers, not __main__
+    from .combinedsolver import CombinedSolver
+    
+    base.clearcache()
+    tracing.start()
+    CombinedSolver(['A1', 'B2', 'C3'])
+    tracing.stop()
+    CombinedSolver(['A1', 'B2', 'C4'])
+    
+    events = tracing.trace()['traceEvents']
+    assert events[0]['name'] == 'CombinedSolver' and events[0]['args']['depth'] == 0
+    assert events[0]['args']['series'] == digest(['A1', 'B2', 'C3'])
+    assert events[0]['args']['outcome'] == 'solved'
+    assert all(event['args']['depth'] > 0 for event in events[1:])
+    assert any(event['name'] == 'SplitSolver' for event in events)
+    assert any(event['args']['outcome'] == 'failed' for event in events)
+    
+    last = max(event['ts'] + event['dur'] for event in events)
+    assert events[0]['ts'] + events[0]['dur'] == last # The other spans are inside it
+    
+    print("OK")
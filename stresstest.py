@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+'''Stress test for using the library from several threads at the same time.
+Solves the series of the test case files first in one thread, and then in many
+threads sharing the caches, and checks that the results are the same.'''
+
+import sys
+import random
+import argparse
+import threading
+
+import lib
+from benchmark import readseries
+
+def results(series):
+    '''Everything that is compared for a series: the next entries, the next entries
+    of the alternative solutions and the entries over a small digit budget.'''
+    try:
+        solver = lib.Solver(series)
+    except lib.UnsolvableException:
+        return None
+    
+    alternatives = [s.generatelist(3) for s in lib.Solver(series, top_k = 3).alternatives()]
+    budget = [str(v) for v in solver.generatelist(20, maxdigits = 6)]
+    return solver.generatelist(10), alternatives, budget
+
+def solving(allseries, expected, rounds, errors):
+    '''Solve the series in random order, starting from the shared caches.'''
+    order = list(range(len(allseries))) * rounds
+    random.shuffle(order)
+    
+    for i in order:
+        if results(allseries[i]) != expected[i]:
+            errors.append("Solving differs for series: " + ' '.join(allseries[i]))
+
+def generating(solvers, expected, rounds, errors):
+    '''Generate entries from the solvers shared by all the threads.'''
+    for n in range(rounds):
+        for solver, values in zip(solvers, expected):
+            count = random.randint(1, len(values))
+            if solver.generatelist(count) != values[:count]:
+                errors.append("Generating differs for series: " + ' '.join(solver.series))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument('files', nargs = '+', help = 'test case files, as for clitest.py')
+    parser.add_argument('-t', '--threads', type = int, default = 8, help = 'number of threads')
+    parser.add_argument('-r', '--rounds', type = int, default = 3,
+                        help = 'number of times each thread goes through the series')
+    args = parser.parse_args()
+    
+    allseries = []
+    for filename in args.files:
+        allseries += readseries(filename)
+    
+    lib.base.clearcache()
+    expected = [results(series) for series in allseries]
+    
+    # Solved again, so that the threads start generating from empty caches
+    lib.base.clearcache()
+    solvers = [lib.Solver(series) for series, r in zip(allseries, expected) if r is not None]
+    generated = [r[0] for r in expected if r is not None]
+    lib.base.clearcache()
+    
+    sys.setswitchinterval(1e-5) # Switch threads often, to make races likely
+    errors = []
+    threads = []
+    
+    for n in range(args.threads):
+        if n % 2 == 0:
+            target, targs = solving, (allseries, expected, args.rounds, errors)
+        else:
+            target, targs = generating, (solvers, generated, args.rounds, errors)
+        
+        threads.append(threading.Thread(target = target, args = targs))
+    
+    for thread in threads:
+        thread.start()
+    
+    for thread in threads:
+        thread.join()
+    
+    for error in sorted(set(errors)):
+        print(error)
+    
+    print("%d series, %d threads: %d errors" % (len(allseries), args.threads, len(errors)))
+    sys.exit(1 if errors else 0)